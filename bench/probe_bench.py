@@ -0,0 +1,92 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+"""Microbenchmark: old cv2 get_video_metadata vs utils.probe.
+
+    python bench/probe_bench.py [video ...] [--rounds N]
+
+Without files, a few test clips are generated with ffmpeg in a temp dir.
+Redirect the output to bench_output.txt to keep it.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+from utils import probe as P  # noqa: E402
+
+SAMPLES = [(10, '640x360'), (30, '1280x720'), (60, '1920x1080')]
+
+
+async def cv2_metadata(file_path):
+    # utils.func.get_video_metadata before the probe service, executor leak included
+    loop = asyncio.get_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+    def _extract():
+        vcap = cv2.VideoCapture(file_path)
+        if not vcap.isOpened():
+            return None
+        w = round(vcap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h = round(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = vcap.get(cv2.CAP_PROP_FPS)
+        frames = vcap.get(cv2.CAP_PROP_FRAME_COUNT)
+        vcap.release()
+        return {'width': w, 'height': h, 'duration': round(frames / fps) if fps > 0 else 0}
+
+    return await loop.run_in_executor(executor, _extract)
+
+
+def make_samples(folder):
+    files = []
+    for dur, size in SAMPLES:
+        out = os.path.join(folder, f'sample_{size}_{dur}s.mp4')
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'testsrc=duration={dur}:size={size}:rate=30',
+                        '-f', 'lavfi', '-i', f'sine=duration={dur}', '-c:v', 'libx264', '-preset', 'ultrafast',
+                        '-c:a', 'aac', '-shortest', out], check=True)
+        files.append(out)
+    return files
+
+
+async def timed(fn, path, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        P.cache.clear()
+        t = time.perf_counter()
+        await fn(path)
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('files', nargs='*')
+    ap.add_argument('--rounds', type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.files or make_samples(tmp)
+        print(f"{'file':40} {'cv2 ms':>10} {'ffprobe ms':>11} {'cached ms':>10}  result")
+        for f in files:
+            old = await timed(cv2_metadata, f, args.rounds)
+            new = await timed(P.probe, f, args.rounds)
+            await P.probe(f)
+            t = time.perf_counter()
+            info = await P.probe(f)
+            hit = (time.perf_counter() - t) * 1000
+            print(f"{os.path.basename(f)[:40]:40} {old:10.1f} {new:11.1f} {hit:10.3f}  "
+                  f"{info['width']}x{info['height']} {info['duration']}s {info['vcodec']}/{info['acodec']} {info['bitrate']}b/s")
+        print(f"threads alive after run: {len(__import__('threading').enumerate())}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -44,6 +44,51 @@ INSTA_COOKIES = os.getenv("INSTA_COOKIES", INST_COOKIES)
 FREEMIUM_LIMIT = int(os.getenv("FREEMIUM_LIMIT", "0"))
 PREMIUM_LIMIT  = int(os.getenv("PREMIUM_LIMIT", "500"))
 
+# ─── BATCH PIPELINE ─────────────────────────────────────────────────────────────
+BATCH_PREFETCH    = int(os.getenv("BATCH_PREFETCH", "8"))  # max messages in flight per batch
+BATCH_FETCHERS    = int(os.getenv("BATCH_FETCHERS", "2"))
+BATCH_DOWNLOADERS = int(os.getenv("BATCH_DOWNLOADERS", "2"))
+BATCH_UPLOADERS   = int(os.getenv("BATCH_UPLOADERS", "2"))
+
+# ─── FLOOD CONTROL ──────────────────────────────────────────────────────────────
+PACE_RATE     = float(os.getenv("PACE_RATE", "5"))  # max API calls per second per client
+PACE_BURST    = int(os.getenv("PACE_BURST", "10"))
+FLOOD_RETRIES = int(os.getenv("FLOOD_RETRIES", "3"))  # retries of one call after FloodWait
+
+# ─── FILE CACHE ─────────────────────────────────────────────────────────────────
+FILE_CACHE_GB = float(os.getenv("FILE_CACHE_GB", "50"))  # copies kept in LOG_GROUP, 0 disables
+
+# ─── STREAMING RELAY ────────────────────────────────────────────────────────────
+STREAM_RELAY  = os.getenv("STREAM_RELAY", "False").lower() == "true"  # pipe < 2GB media without disk
+RELAY_WORKERS = int(os.getenv("RELAY_WORKERS", "4"))  # parallel part uploads
+RELAY_BUFFER  = int(os.getenv("RELAY_BUFFER", "16"))  # 512 KB parts held in memory per transfer
+
+# ─── SMALL MEDIA ────────────────────────────────────────────────────────────────
+MEMORY_LIMIT  = int(os.getenv("MEMORY_LIMIT_MB", "20")) * 1024 * 1024  # handled in RAM, not on disk
+
+# ─── PARALLEL DOWNLOADS ─────────────────────────────────────────────────────────
+DL_WORKERS    = int(os.getenv("DL_WORKERS", "4"))  # media sessions per download, 1 disables
+FAST_DL_MIN   = int(os.getenv("FAST_DL_MIN_MB", "20")) * 1024 * 1024
+DL_RETRIES    = int(os.getenv("DL_RETRIES", "3"))  # resumed attempts before a plain download
+
+# ─── PARALLEL UPLOADS ───────────────────────────────────────────────────────────
+UP_WORKERS    = int(os.getenv("UP_WORKERS", "4"))  # media sessions per upload, 1 disables
+FAST_UP_MIN   = int(os.getenv("FAST_UP_MIN_MB", "20")) * 1024 * 1024
+
+# ─── SCHEDULER ──────────────────────────────────────────────────────────────────
+MAX_TRANSFERS  = int(os.getenv("MAX_TRANSFERS", "8"))  # transfers running at once, all users
+USER_TRANSFERS = int(os.getenv("USER_TRANSFERS", "2"))  # of which one user may hold
+PREMIUM_WEIGHT = int(os.getenv("PREMIUM_WEIGHT", "3"))  # queue share of premium users vs free ones
+
+# ─── ADMISSION CONTROL ──────────────────────────────────────────────────────────
+DISK_HEADROOM = int(os.getenv("DISK_HEADROOM_MB", "1024")) * 1024 * 1024  # always left free on disk
+MAX_RSS       = int(os.getenv("MAX_RSS_MB", "0")) * 1024 * 1024  # 0 = 75% of RAM
+FD_BUDGET     = float(os.getenv("FD_BUDGET", "0.8"))  # share of the open files limit
+
+# ─── MEDIA TOOLS ────────────────────────────────────────────────────────────────
+FFMPEG_WORKERS = int(os.getenv("FFMPEG_WORKERS", "2"))  # ffprobe/ffmpeg processes at once
+REMUX          = os.getenv("REMUX", "True").lower() == "true"  # stream-copy videos to faststart MP4
+
 # ─── UI / LINKS ─────────────────────────────────────────────────────────────────
 JOIN_LINK     = os.getenv("JOIN_LINK", "https://t.me/team_spy_pro")
 ADMIN_CONTACT = os.getenv("ADMIN_CONTACT", "https://t.me/username_of_admin")
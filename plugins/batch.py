@@ -2,26 +2,46 @@
 # Licensed under the GNU General Public License v3.0.  
 # See LICENSE file in the repository root for full license text.
 
-import os, re, time, asyncio, json, asyncio 
-from pyrogram import Client, filters
-from pyrogram.types import Message
-from pyrogram.errors import UserNotParticipant
+import os, re, io, time, asyncio, asyncio, mimetypes
+from pyrogram import Client, filters, StopTransmission, raw
+from pyrogram.types import Message, InputMediaPhoto, InputMediaVideo, InputMediaAudio, InputMediaDocument
+from pyrogram.errors import UserNotParticipant, PeerIdInvalid, ChannelInvalid, ChannelPrivate
 from config import API_ID, API_HASH, LOG_GROUP, STRING, FORCE_SUB, FREEMIUM_LIMIT, PREMIUM_LIMIT
-from utils.func import get_user_data, screenshot, thumbnail, get_video_metadata
-from utils.func import get_user_data_key, process_text_with_rules, is_premium_user, E
+from config import BATCH_PREFETCH, BATCH_FETCHERS, BATCH_DOWNLOADERS, BATCH_UPLOADERS, STREAM_RELAY, MEMORY_LIMIT
+from config import FAST_DL_MIN, DL_RETRIES, UP_WORKERS, FAST_UP_MIN
+from utils.func import get_user_data, thumbnail, VIDEO_EXTENSIONS
+from utils.func import get_user_data_key, apply_text_rules, is_premium_user, E, has_rename_rules
 from shared_client import app as X
-from plugins.settings import rename_file
+from plugins.settings import build_name
 from plugins.start import subscribe as sub
 from utils.custom_filters import login_in_progress
 from utils.encrypt import dcs
+from utils.pipeline import Pipeline
+from utils.scheduler import scheduler
+from utils.admission import admission
+from utils.tasks import spawn, running, cancel
+from utils.journal import Journal
+from utils.governor import paced, skippable
+from utils.peers import load_peers, save_peers, known
+from utils.filecache import unique_id, media_of, cacheable, lookup, forget, store
+from utils.flight import SingleFlight, private_copy, remove_file
+from utils.relay import relay
+from utils.upload import save_file, save_bytes, send_uploaded
+from utils.download import fast_download, discard_partial, Unsupported
+from utils.mediainfo import source_thumb, thumb_file, video_meta
+from utils.remux import streamable
 from typing import Dict, Any, Optional
 
 
 Y = None if not STRING else __import__('shared_client').userbot
 Z, P, UB, UC, emp = {}, {}, {}, {}, {}
+WARM = set()  # clients whose persisted peers are already loaded
+DL = SingleFlight(release=remove_file)  # running downloads by (chat, message id, file_unique_id)
+PR = {}  # (client that can read it, link id) -> {'via': 'c' or 'u', 'form': chat id form that worked, 'id': resolved chat id}
 
 ACTIVE_USERS = {}
-ACTIVE_USERS_FILE = "active_users.json"
+ACTIVE_USERS_FILE = "active_users.json"  # old whole-file format, migrated into the journal
+JOBS = Journal("active_users.jsonl", legacy=ACTIVE_USERS_FILE)
 
 # fixed directory file_name problems 
 def sanitize(filename):
@@ -29,23 +49,14 @@ def sanitize(filename):
 
 def load_active_users():
     try:
-        if os.path.exists(ACTIVE_USERS_FILE):
-            with open(ACTIVE_USERS_FILE, 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception:
-        return {}
-
-async def save_active_users_to_file():
-    try:
-        with open(ACTIVE_USERS_FILE, 'w') as f:
-            json.dump(ACTIVE_USERS, f)
+        return JOBS.load()
     except Exception as e:
-        print(f"Error saving active users: {e}")
+        print(f"Error loading active users: {e}")
+        return {}
 
 async def add_active_batch(user_id: int, batch_info: Dict[str, Any]):
     ACTIVE_USERS[str(user_id)] = batch_info
-    await save_active_users_to_file()
+    JOBS.put(str(user_id), batch_info)
 
 def is_user_active(user_id: int) -> bool:
     return str(user_id) in ACTIVE_USERS
@@ -54,12 +65,12 @@ async def update_batch_progress(user_id: int, current: int, success: int):
     if str(user_id) in ACTIVE_USERS:
         ACTIVE_USERS[str(user_id)]["current"] = current
         ACTIVE_USERS[str(user_id)]["success"] = success
-        await save_active_users_to_file()
+        JOBS.put(str(user_id), ACTIVE_USERS[str(user_id)])
 
 async def request_batch_cancel(user_id: int):
     if str(user_id) in ACTIVE_USERS:
         ACTIVE_USERS[str(user_id)]["cancel_requested"] = True
-        await save_active_users_to_file()
+        JOBS.put(str(user_id), ACTIVE_USERS[str(user_id)])
         return True
     return False
 
@@ -67,47 +78,101 @@ def should_cancel(user_id: int) -> bool:
     user_str = str(user_id)
     return user_str in ACTIVE_USERS and ACTIVE_USERS[user_str].get("cancel_requested", False)
 
+def check_cancel(user_id):
+    # raised from progress callbacks, Pyrogram aborts the transfer and drops its partial file
+    if should_cancel(user_id): raise StopTransmission
+
+async def watched(user_id, aw):
+    # for waits that have no progress callback of ours (a shared download): leave them on cancel
+    task = asyncio.ensure_future(aw)
+    while not task.done():
+        await asyncio.wait({task}, timeout=0.5)
+        if not task.done() and should_cancel(user_id):
+            task.cancel()
+            raise StopTransmission
+    return task.result()
+
+async def slotted(user_id, premium, on_wait, fn):
+    # one transfer slot, waiting for it ends when the user cancels; disk room is reserved
+    # inside, right before a download writes (always slot first, then disk, like /dl)
+    await watched(user_id, scheduler.acquire(user_id, premium, on_wait))
+    try:
+        return await fn()
+    finally:
+        scheduler.release(user_id)
+
+def expected_size(m):
+    media = media_of(m) if m and m.media else None
+    return getattr(media, 'file_size', 0) or 0
+
 async def remove_active_batch(user_id: int):
     if str(user_id) in ACTIVE_USERS:
         del ACTIVE_USERS[str(user_id)]
-        await save_active_users_to_file()
+        JOBS.delete(str(user_id))
 
 def get_batch_info(user_id: int) -> Optional[Dict[str, Any]]:
     return ACTIVE_USERS.get(str(user_id))
 
+def batch_done(user_id: int) -> int:
+    return (get_batch_info(user_id) or {}).get("current", 0)
+
 ACTIVE_USERS = load_active_users()
 
 async def upd_dlg(c):
     try:
         async for _ in c.get_dialogs(limit=100): pass
+        await save_peers(c)
         return True
     except Exception as e:
         print(f'Failed to update dialogs: {e}')
         return False
 
+def remember(u, i, via, form, xm):
+    # `u` is the client that read the chat: the user session for 'u' routes, the user's bot for 'c' ones
+    # (users without a session share Y, a bot route stored under Y would be replayed with another bot)
+    if xm and not getattr(xm, "empty", False):
+        PR[(getattr(u, 'name', None), i)] = {'via': via, 'form': form, 'id': xm.chat.id}
+        if via == 'u': asyncio.ensure_future(save_peers(u, xm.chat.id))
+
 # fixed the old group of 2021-2022 extraction 🌝 (buy krne ka fayda nhi ab old group) ✅ 
 async def get_msg(c, u, i, d, lt):
     try:
+        key = next((k for k in ((getattr(u, 'name', None), i), (getattr(c, 'name', None), i)) if k in PR), None)
+        hit = PR.get(key)
+        if hit:
+            try:
+                xm = await paced((c if hit['via'] == 'c' else u).get_messages, hit['id'], d)
+                if lt == 'public' or (xm and not getattr(xm, "empty", False)):
+                    return xm
+                return None
+            except (PeerIdInvalid, ChannelInvalid, ChannelPrivate) as e:
+                print(f'Cached peer for {i} is no longer valid: {e}')
+                PR.pop(key, None)
+
         if lt == 'public':
             try:
                 if str(i).lower().endswith('bot'):
                     emp[i] = False
-                    xm = await u.get_messages(i, d)
+                    xm = await paced(u.get_messages, i, d)
                     emp[i] = getattr(xm, "empty", False)
                     if not emp[i]:
                         emp[i] = True
+                        remember(u, i, 'u', i, xm)
                         print(f"Bot chat found successfully...")
                         return xm
                     
-                if emp[i]:
-                    xm = await c.get_messages(i, d)
+                if emp.get(i, True):
+                    xm = await paced(c.get_messages, i, d)
                     print(f"fetched by {c.me.username}")
                     emp[i] = getattr(xm, "empty", False)
                     if emp[i]:
                         print(f"Not fetched by {c.me.username}")
-                        try: await u.join_chat(i)
+                        try: await paced(u.join_chat, i)
                         except: pass
-                        xm = await u.get_messages((await u.get_chat(f"@{i}")).id, d)
+                        xm = await paced(u.get_messages, (await paced(u.get_chat, f"@{i}")).id, d)
+                        remember(u, i, 'u', f"@{i}", xm)
+                    else:
+                        remember(c, i, 'c', i, xm)
                     
                     return xm                   
             except Exception as e:
@@ -116,7 +181,8 @@ async def get_msg(c, u, i, d, lt):
         else:
             if u:
                 try:
-                    async for _ in u.get_dialogs(limit=50): pass
+                    if not await known(u, i):
+                        async for _ in u.get_dialogs(limit=50): pass
                     
                     # Try with -100 prefix first
                     if str(i).startswith('-100'):
@@ -133,16 +199,18 @@ async def get_msg(c, u, i, d, lt):
                     
                     # Try -100 format first
                     try:
-                        result = await u.get_messages(chat_id_100, d)
+                        result = await paced(u.get_messages, chat_id_100, d)
                         if result and not getattr(result, "empty", False):
+                            remember(u, i, 'u', chat_id_100, result)
                             return result
                     except Exception:
                         pass
                     
                     # Try - format second
                     try:
-                        result = await u.get_messages(chat_id_dash, d)
+                        result = await paced(u.get_messages, chat_id_dash, d)
                         if result and not getattr(result, "empty", False):
+                            remember(u, i, 'u', chat_id_dash, result)
                             return result
                     except Exception:
                         pass
@@ -150,8 +218,9 @@ async def get_msg(c, u, i, d, lt):
                     # Final fallback - refresh dialogs and try original
                     try:
                         async for _ in u.get_dialogs(limit=200): pass
-                        result = await u.get_messages(i, d)
+                        result = await paced(u.get_messages, i, d)
                         if result and not getattr(result, "empty", False):
+                            remember(u, i, 'u', i, result)
                             return result
                     except Exception:
                         pass
@@ -167,12 +236,77 @@ async def get_msg(c, u, i, d, lt):
         return None
 
 
+ALBUM = 'album member'
+
+class Window:
+    # whole batch range in chunks of up to 200 ids per get_messages call;
+    # the working client/chat is found once with get_msg on the first ids
+    def __init__(self, c, u, i, s, n, lt, size=200):
+        self.c, self.u, self.i, self.s, self.n, self.lt = c, u, i, int(s), n, lt
+        self.size = size
+        self.src = None
+        self.chunks = {}
+        self.lock = asyncio.Lock()
+
+    async def _resolve(self):
+        for j in range(min(self.n, 5)):
+            msg = await get_msg(self.c, self.u, self.i, self.s + j, self.lt)
+            if msg and not getattr(msg, "empty", False):
+                return msg._client, msg.chat.id
+        return False
+
+    async def _load(self, k):
+        cl, cid = self.src
+        ids = list(range(self.s + k * self.size, self.s + min((k + 1) * self.size, self.n)))
+        msgs = await paced(cl.get_messages, cid, ids)
+        return {x.id: x for x in msgs if x and not getattr(x, "empty", False)}
+
+    def _chunk(self, k):
+        if k * self.size < self.n and k not in self.chunks:
+            self.chunks[k] = asyncio.ensure_future(self._load(k))
+        return self.chunks.get(k)
+
+    async def get(self, j):
+        async with self.lock:
+            if self.src is None:
+                self.src = await self._resolve()
+        if not self.src:
+            return await get_msg(self.c, self.u, self.i, self.s + j, self.lt)
+        k = j // self.size
+        for old in [x for x in self.chunks if x < k - 1]:
+            self.chunks.pop(old)
+        t = self._chunk(k)
+        self._chunk(k + 1)
+        try:
+            buf = await asyncio.shield(t)
+        except Exception as e:
+            print(f'Bulk fetch failed, falling back to single fetch: {e}')
+            return await get_msg(self.c, self.u, self.i, self.s + j, self.lt)
+        return buf.get(self.s + j)
+
+    async def album(self, j, first=0):
+        # whole media group at its first message, ALBUM for the members after it
+        msg = await self.get(j)
+        gid = getattr(msg, 'media_group_id', None)
+        if not gid:
+            return msg
+        if j > first and getattr(await self.get(j - 1), 'media_group_id', None) == gid:
+            return ALBUM
+        group = [msg]
+        while j + len(group) < self.n and len(group) < 10:
+            x = await self.get(j + len(group))
+            if getattr(x, 'media_group_id', None) != gid:
+                break
+            group.append(x)
+        return group if len(group) > 1 else msg
+
 async def get_ubot(uid):
     bt = await get_user_data_key(uid, "bot_token", None)
     if not bt: return None
     if uid in UB: return UB.get(uid)
     try:
-        bot = Client(f"user_{uid}", bot_token=bt, api_id=API_ID, api_hash=API_HASH)
+        # sleep_threshold=0: every FloodWait reaches `paced`, which slows this client down
+        bot = Client(f"user_{uid}", bot_token=bt, api_id=API_ID, api_hash=API_HASH, sleep_threshold=0)
         await bot.start()
         UB[uid] = bot
         return bot
@@ -190,9 +324,10 @@ async def get_uclient(uid):
     if xxx:
         try:
             ss = dcs(xxx)
-            gg = Client(f'{uid}_client', api_id=API_ID, api_hash=API_HASH, device_model="v3saver", session_string=ss)
+            gg = Client(f'{uid}_client', api_id=API_ID, api_hash=API_HASH, device_model="v3saver", session_string=ss,
+                        sleep_threshold=0)
             await gg.start()
-            await upd_dlg(gg)
+            if not await load_peers(gg): await upd_dlg(gg)
             UC[uid] = gg
             return gg
         except Exception as e:
@@ -202,6 +337,7 @@ async def get_uclient(uid):
 
 async def prog(c, t, C, h, m, st):
     global P
+    check_cancel(h)
     p = c / t * 100
     interval = 10 if t >= 100 * 1024 * 1024 else 20 if t >= 50 * 1024 * 1024 else 30 if t >= 10 * 1024 * 1024 else 50
     step = int(p // interval) * interval
@@ -212,26 +348,33 @@ async def prog(c, t, C, h, m, st):
         bar = '🟢' * int(p / 10) + '🔴' * (10 - int(p / 10))
         speed = c / (time.time() - st) / (1024 * 1024) if time.time() > st else 0
         eta = time.strftime('%M:%S', time.gmtime((t - c) / (speed * 1024 * 1024))) if speed > 0 else '00:00'
-        await C.edit_message_text(h, m, f"__**Pyro Handler...**__\n\n{bar}\n\n⚡**__Completed__**: {c_mb:.2f} MB / {t_mb:.2f} MB\n📊 **__Done__**: {p:.2f}%\n🚀 **__Speed__**: {speed:.2f} MB/s\n⏳ **__ETA__**: {eta}\n\n**__Powered by Team SPY__**")
-        if p >= 100: P.pop(m, None)
+        ok = await skippable(C.edit_message_text, h, m, f"__**Pyro Handler...**__\n\n{bar}\n\n⚡**__Completed__**: {c_mb:.2f} MB / {t_mb:.2f} MB\n📊 **__Done__**: {p:.2f}%\n🚀 **__Speed__**: {speed:.2f} MB/s\n⏳ **__ETA__**: {eta}\n\n**__Powered by Team SPY__**")
+        if p >= 100 or not ok: P.pop(m, None)
+
+async def shared_prog(*args):
+    # a shared download belongs to everyone who joined it, one user's cancel must not abort it
+    try:
+        await prog(*args)
+    except StopTransmission:
+        pass
 
 async def send_direct(c, m, tcid, ft=None, rtmid=None):
     try:
         if m.video:
-            await c.send_video(tcid, m.video.file_id, caption=ft, duration=m.video.duration, width=m.video.width, height=m.video.height, reply_to_message_id=rtmid)
+            await paced(c.send_video, tcid, m.video.file_id, caption=ft, duration=m.video.duration, width=m.video.width, height=m.video.height, reply_to_message_id=rtmid)
         elif m.video_note:
-            await c.send_video_note(tcid, m.video_note.file_id, reply_to_message_id=rtmid)
+            await paced(c.send_video_note, tcid, m.video_note.file_id, reply_to_message_id=rtmid)
         elif m.voice:
-            await c.send_voice(tcid, m.voice.file_id, reply_to_message_id=rtmid)
+            await paced(c.send_voice, tcid, m.voice.file_id, reply_to_message_id=rtmid)
         elif m.sticker:
-            await c.send_sticker(tcid, m.sticker.file_id, reply_to_message_id=rtmid)
+            await paced(c.send_sticker, tcid, m.sticker.file_id, reply_to_message_id=rtmid)
         elif m.audio:
-            await c.send_audio(tcid, m.audio.file_id, caption=ft, duration=m.audio.duration, performer=m.audio.performer, title=m.audio.title, reply_to_message_id=rtmid)
+            await paced(c.send_audio, tcid, m.audio.file_id, caption=ft, duration=m.audio.duration, performer=m.audio.performer, title=m.audio.title, reply_to_message_id=rtmid)
         elif m.photo:
             photo_id = m.photo.file_id if hasattr(m.photo, 'file_id') else m.photo[-1].file_id
-            await c.send_photo(tcid, photo_id, caption=ft, reply_to_message_id=rtmid)
+            await paced(c.send_photo, tcid, photo_id, caption=ft, reply_to_message_id=rtmid)
         elif m.document:
-            await c.send_document(tcid, m.document.file_id, caption=ft, file_name=m.document.file_name, reply_to_message_id=rtmid)
+            await paced(c.send_document, tcid, m.document.file_id, caption=ft, file_name=m.document.file_name, reply_to_message_id=rtmid)
         else:
             return False
         return True
@@ -239,154 +382,478 @@ async def send_direct(c, m, tcid, ft=None, rtmid=None):
         print(f'Direct send error: {e}')
         return False
 
-async def process_msg(c, u, m, d, lt, uid, i):
+RELAY_KINDS = {'video': '.mp4', 'video_note': '.mp4', 'audio': '.mp3', 'voice': '.ogg', 'document': ''}
+
+def relay_kind(m):
+    for k in RELAY_KINDS:
+        if getattr(m, k, None): return k
+    return None
+
+async def relay_msg(c, u, m, d, p, st, kind):
+    media = getattr(m, kind)
+    name = sanitize(getattr(media, 'file_name', None) or f"{time.time()}{RELAY_KINDS[kind]}")
+    file = await relay(u, c, m, media, name, progress=prog, progress_args=(c, d, p.id, st))
+    tb = await source_thumb(u, media, d) if kind != 'voice' else None
+    side = getattr(media, 'length', 0)
+    return {'kind': kind, 'file': file, 'meta': {
+        'thumb': await save_bytes(c, tb, 'thumb.jpg') if tb else None,
+        'mime_type': getattr(media, 'mime_type', None), 'file_name': name,
+        'duration': getattr(media, 'duration', 0), 'width': getattr(media, 'width', side),
+        'height': getattr(media, 'height', side), 'performer': getattr(media, 'performer', None),
+        'title': getattr(media, 'title', None)}}
+
+async def fresh_media(u, m):
+    # file references expire on long batches, the message carries a new one
+    return media_of(await paced(u.get_messages, m.chat.id, m.id))
+
+def job_name(m, rules):
+    """Final file name of `m`: its own name with the user's rename rules applied, else one from the message id.
+
+    `rules` is the user's data as fetched once for the job, so naming costs no queries.
+    """
+    name = getattr(media_of(m), 'file_name', None)
+    if not name:
+        return f"{m.chat.id}_{m.id}{'.jpg' if m.photo else RELAY_KINDS.get(relay_kind(m), '')}"
+    r = rules or {}
+    return sanitize(build_name(name, r.get('delete_words', []), r.get('rename_tag', ''), r.get('replacement_words', {})))
+
+def job_path(d, p, m, name):
+    # one folder per item, so two items with the same file name never meet (album members share p)
+    return os.path.abspath(os.path.join('downloads', f'{d}_{p.id}_{m.id}', name))
+
+async def fetch_file(u, m, path, progress_args):
+    media = media_of(m)
+    if (media.file_size or 0) >= FAST_DL_MIN:
+        # fixed name for the partial file, so a retry or a batch resumed after a restart continues it
+        part = os.path.abspath(os.path.join('downloads', f'{m.chat.id}_{m.id}_{media.file_unique_id}.part'))
+        for attempt in range(DL_RETRIES):
+            try:
+                await fast_download(u, media, part, progress=shared_prog, progress_args=progress_args,
+                                    refresh=lambda: fresh_media(u, m))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(part, path)
+                return path
+            except StopTransmission:
+                raise
+            except Unsupported as e:
+                print(f'Chunked download not possible: {e}')
+                discard_partial(part)
+                break
+            except Exception as e:
+                print(f'Chunked download failed ({attempt + 1}/{DL_RETRIES}): {e}')
+                await asyncio.sleep(2 ** attempt)
+        print('Retrying with download_media')
+        try:
+            f = await paced(u.download_media, m, file_name=path, progress=shared_prog, progress_args=progress_args)
+        except (StopTransmission, asyncio.CancelledError):
+            discard_partial(part)
+            raise
+        # the chunks fetched so far stay until the item is really downloaded, the next try resumes them
+        if f: discard_partial(part)
+        return f
+    return await paced(u.download_media, m, file_name=path, progress=shared_prog, progress_args=progress_args)
+
+def target(ud, d):
+    # chat (and topic) the user set with /settings, else the private chat
+    cfg_chat = (ud or {}).get('chat_id')
+    tcid = d
+    rtmid = None
+    if cfg_chat:
+        if '/' in cfg_chat:
+            parts = cfg_chat.split('/', 1)
+            tcid = int(parts[0])
+            rtmid = int(parts[1]) if len(parts) > 1 else None
+        else:
+            tcid = int(cfg_chat)
+    return tcid, rtmid
+
+async def cached_copy_alive(c, hit):
     try:
-        cfg_chat = await get_user_data_key(d, 'chat_id', None)
-        tcid = d
-        rtmid = None
-        if cfg_chat:
-            if '/' in cfg_chat:
-                parts = cfg_chat.split('/', 1)
-                tcid = int(parts[0])
-                rtmid = int(parts[1]) if len(parts) > 1 else None
-            else:
-                tcid = int(cfg_chat)
+        x = await paced(c.get_messages, hit['chat_id'], hit['message_id'])
+        return bool(x and not x.empty)
+    except Exception as e:
+        print(f'Cannot check cached copy {hit["message_id"]}: {e}')
+        return False
+
+async def dl_msg(c, u, m, d, lt, uid, i, ud, cache=True, on_hold=None, status=None):
+    # `ud` is the user's data fetched once per job: settings, caption and rename rules cost no queries here
+    tcid, rtmid = target(ud, d)
+    J = {'m': m, 'd': d, 'tcid': tcid, 'rtmid': rtmid, 'ft': None, 'f': None, 'p': None, 'direct': False, 'res': None}
+
+    if m.media:
+        orig_text = m.caption.markdown if m.caption else ''
+        proc_text = apply_text_rules(ud, orig_text)
+        user_cap = (ud or {}).get('caption', '')
+        J['ft'] = f'{proc_text}\n\n{user_cap}' if proc_text and user_cap else user_cap if user_cap else proc_text
         
-        if m.media:
-            orig_text = m.caption.markdown if m.caption else ''
-            proc_text = await process_text_with_rules(d, orig_text)
-            user_cap = await get_user_data_key(d, 'caption', '')
-            ft = f'{proc_text}\n\n{user_cap}' if proc_text and user_cap else user_cap if user_cap else proc_text
-            
-            if lt == 'public' and not emp.get(i, False):
-                await send_direct(c, m, tcid, ft, rtmid)
-                return 'Sent directly.'
-            
+        if lt == 'public' and not emp.get(i, False):
+            J['direct'] = True
+            return J
+        
+        fu = unique_id(m)
+        if fu and cacheable(ud, thumbnail(d)):
+            J['fu'] = fu
+            hit = await lookup(fu) if cache else None
+            if hit and not await cached_copy_alive(c, hit):
+                # found out here, so the item downloads in this stage, under its slot, not after its turn
+                await forget(fu)
+                hit = None
+            if hit:
+                J['hit'] = hit
+                J['redo'] = lambda: dl_msg(c, u, m, d, lt, uid, i, ud, cache=False, on_hold=on_hold, status=status)
+                return J
+        
+        st = time.time()
+        # `status()` gives the one status message all members of an album share
+        p = J['p'] = await status() if status else await paced(c.send_message, d, 'Downloading...')
+        J['album'] = bool(status)
+
+        # relayed and in-memory transfers live in RAM: they wait for the memory and open-file budgets
+        token = await watched(d, admission.reserve(0, d, on_hold))
+        try:
+            kind = relay_kind(m)
+            if STREAM_RELAY and kind and 0 < (media_of(m).file_size or 0) < 2 * 1024 ** 3 and not has_rename_rules(ud):
+                try:
+                    J['up'] = await relay_msg(c, u, m, d, p, st, kind)
+                    return J
+                except StopTransmission:
+                    raise
+                except Exception as e:
+                    print(f'Relay failed, falling back to download: {e}')
+
+            media = media_of(m)
+            if 0 < (media.file_size or 0) <= MEMORY_LIMIT and not (m.document and (m.document.mime_type or '').startswith('video/')):
+                buf = await paced(u.download_media, m, in_memory=True, progress=prog, progress_args=(c, d, p.id, st))
+                if buf:
+                    if getattr(media, 'file_name', None):
+                        buf.name = job_name(m, ud)
+                    if m.video: J['th'] = await thumb_file(u, media, d)
+                    J['f'] = buf
+                    return J
+                check_cancel(d)
+        finally:
+            admission.release(token)
+
+        key = (m.chat.id, m.id, fu)
+        shared = os.path.abspath(os.path.join('downloads', f'{m.chat.id}_{m.id}_{fu}'))
+        own = job_path(d, p, m, job_name(m, ud))
+        if DL.running(key):
+            await paced(c.edit_message_text, d, p.id, 'Same file is already downloading for someone, waiting...')
+        async def joined():
+            async with DL.join(key, lambda: fetch_file(u, m, shared, progress_args=(c, d, p.id, st))) as f:
+                return await private_copy(f, own) if f else None
+        # only this branch writes to disk; direct sends, cache hits, relays and in-memory items need no disk room
+        try:
+            token = await watched(d, admission.reserve(expected_size(m), d, on_hold))
+        except IOError as e:
+            await paced(c.edit_message_text, d, p.id, str(e))
+            J['res'] = 'Failed.'
+            return J
+        try:
+            f = await watched(d, joined())
+        finally:
+            admission.release(token)
+        
+        if not f:
+            await paced(c.edit_message_text, d, p.id, 'Failed.')
+            J['res'] = 'Failed.'
+            return J
+        if m.video or (m.document and (m.document.mime_type or '').startswith('video/')):
+            J['th'] = await thumb_file(u, media, d)
+        J['f'] = f
+    return J
+
+async def send_parallel(c, J, f, kind, st, turn, thumb=None, **meta):
+    # parts go out over UP_WORKERS media sessions; only the final SendMedia waits for our turn
+    m, d, p = J['m'], J['d'], J['p']
+    file = await save_file(c, f, progress=prog, progress_args=(c, d, p.id, st))
+    if isinstance(thumb, io.BytesIO):
+        thumb = await save_bytes(c, thumb.getvalue(), 'thumb.jpg')
+    elif thumb and os.path.exists(thumb):
+        with open(thumb, 'rb') as fp: thumb = await save_bytes(c, fp.read(), 'thumb.jpg')
+    else:
+        thumb = None
+    await turn()
+    return await paced(send_uploaded, c, J['tcid'], kind, file,
+                       caption=J['ft'] if m.caption and kind not in ('video_note', 'voice') else None,
+                       reply_to_message_id=J['rtmid'], thumb=thumb, mime_type=mimetypes.guess_type(f)[0],
+                       file_name=os.path.basename(f), **meta)
+
+def album_ready(Js):
+    # one send_media_group is possible when every member is a file we have or can send by id
+    if len(Js) < 2:
+        return False
+    for J in Js:
+        if not isinstance(J, dict) or J['res'] or J.get('hit') or J.get('up'):
+            return False
+        m, f = J['m'], J['f']
+        if not (m.photo or m.video or m.audio or m.document) or not (J['direct'] or f):
+            return False
+        if isinstance(f, str) and os.path.getsize(f) > 2 * 1024 ** 3:
+            return False
+    return True
+
+def album_media(J):
+    m, f = J['m'], J['f']
+    src = f or media_of(m).file_id
+    cap = J['ft'] if m.caption else None
+    th = None if J['direct'] else J.get('th') or thumbnail(J['d'])
+    if m.photo:
+        return InputMediaPhoto(src, caption=cap)
+    if m.video:
+        return InputMediaVideo(src, thumb=th, caption=cap, width=m.video.width, height=m.video.height,
+                               duration=m.video.duration, supports_streaming=True)
+    if m.audio:
+        return InputMediaAudio(src, thumb=th, caption=cap, duration=m.audio.duration,
+                               performer=m.audio.performer, title=m.audio.title)
+    return InputMediaDocument(src, thumb=th, caption=cap)
+
+async def send_album(c, Js, turn):
+    media = [album_media(J) for J in Js]
+    await turn()
+    sent = await paced(c.send_media_group, Js[0]['tcid'], media, reply_to_message_id=Js[0]['rtmid'])
+    for J, x in zip(Js, sent or []):
+        if J.get('fu') and x: asyncio.ensure_future(store(c, J['fu'], x, media_of(J['m']).file_size, X))
+    for J in Js:
+        drop_msg(J)
+    return ['Done.'] * len(Js)
+
+async def album_streamable(Js):
+    # album videos get the same MP4 remux as single ones; one that cannot be a video breaks the group
+    ok = True
+    for J in Js:
+        if J['m'].video and isinstance(J['f'], str):
+            J['f'], as_video = await watched(J['d'], streamable(J['f'], J['d']))
+            ok = ok and as_video
+    return ok
+
+async def up_album(c, Js, turn):
+    try:
+        return await _up_album(c, Js, turn)
+    finally:
+        for pid, d in {J['p'].id: J['d'] for J in Js if isinstance(J, dict) and J.get('p')}.items():
+            try: await paced(c.delete_messages, d, pid)
+            except Exception: pass
+
+async def _up_album(c, Js, turn):
+    if album_ready(Js) and await album_streamable(Js) and album_ready(Js):
+        try:
+            return await send_album(c, Js, turn)
+        except StopTransmission:
+            return [await cancelled(c, J) for J in Js]
+        except Exception as e:
+            print(f'Album send failed, sending items one by one: {e}')
+    out = []
+    for J in Js:
+        if not isinstance(J, dict):
+            out.append(J)
+            continue
+        try:
+            out.append(await up_msg(c, J, turn))
+        except StopTransmission:
+            out.append(await cancelled(c, J))
+        except Exception as e:
+            drop_msg(J)
+            out.append(f'Error: {str(e)[:50]}')
+    return out
+
+async def _now(): pass
+
+async def up_msg(c, J, turn=None):
+    m, d, tcid, rtmid, ft, f, p = J['m'], J['d'], J['tcid'], J['rtmid'], J['ft'], J['f'], J['p']
+    turn = turn or _now
+    if J['res']: return J['res']
+    check_cancel(d)
+
+    if m.media:
+        if J['direct']:
+            await turn()
+            await send_direct(c, m, tcid, ft, rtmid)
+            return 'Sent directly.'
+        
+        if J.get('hit'):
+            hit = J['hit']
+            await turn()
+            try:
+                await paced(c.copy_message, tcid, hit['chat_id'], hit['message_id'],
+                            caption=(ft if m.caption else None) or '', reply_to_message_id=rtmid)
+                return 'Copied from cache.'
+            except Exception as e:
+                print(f'Cached copy of {J["fu"]} failed: {e}')
+                await forget(J['fu'])
+                return await up_msg(c, await J['redo'](), turn)
+        
+        if J.get('up'):
+            up = J['up']
+            await turn()
+            sent = await paced(send_uploaded, c, tcid, up['kind'], up['file'], caption=ft if m.caption else None,
+                               reply_to_message_id=rtmid, **up['meta'])
+            await drop_status(c, J)
+            if J.get('fu') and sent: asyncio.ensure_future(store(c, J['fu'], sent, media_of(m).file_size, X))
+            return 'Done.'
+        
+        mem = not isinstance(f, str)
+        fsize = (f.getbuffer().nbytes if mem else os.path.getsize(f)) / (1024 * 1024 * 1024)
+        th = J.get('th') or thumbnail(d)
+        ext = os.path.splitext(f.name if mem else f)[1].lower()
+        as_video = bool(m.video or (m.document and ext[1:] in VIDEO_EXTENSIONS))
+        if as_video and not mem:
+            await paced(c.edit_message_text, d, p.id, 'Preparing video...')
+            f, as_video = await watched(d, streamable(f, d))
+            J['f'] = f
+            fsize = os.path.getsize(f) / (1024 * 1024 * 1024)
+        
+        if fsize > 2 and Y:
             st = time.time()
-            p = await c.send_message(d, 'Downloading...')
-
-            c_name = f"{time.time()}"
-            if m.video:
-                file_name = m.video.file_name
-                if not file_name:
-                    file_name = f"{time.time()}.mp4"
-                    c_name = sanitize(file_name)
-            elif m.audio:
-                file_name = m.audio.file_name
-                if not file_name:
-                    file_name = f"{time.time()}.mp3"
-                    c_name = sanitize(file_name)
-            elif m.document:
-                file_name = m.document.file_name
-                if not file_name:
-                    file_name = f"{time.time()}"
-                    c_name = sanitize(file_name)
-            elif m.photo:
-                file_name = f"{time.time()}.jpg"
-                c_name = sanitize(file_name)
-    
-            f = await u.download_media(m, file_name=c_name, progress=prog, progress_args=(c, d, p.id, st))
+            await paced(c.edit_message_text, d, p.id, 'File is larger than 2GB. Using alternative method...')
+            if Y.name not in WARM:
+                WARM.add(Y.name)
+                await load_peers(Y)
+            if not await known(Y, LOG_GROUP): await upd_dlg(Y)
+            dur, w, h, th = await video_meta(m, f, th, d)
             
-            if not f:
-                await c.edit_message_text(d, p.id, 'Failed.')
-                return 'Failed.'
+            send_funcs = {'video': Y.send_video, 'video_note': Y.send_video_note, 
+                        'voice': Y.send_voice, 'audio': Y.send_audio, 
+                        'photo': Y.send_photo, 'document': Y.send_document}
             
-            await c.edit_message_text(d, p.id, 'Renaming...')
-            if (
-                (m.video and m.video.file_name) or
-                (m.audio and m.audio.file_name) or
-                (m.document and m.document.file_name)
-            ):
-                f = await rename_file(f, d, p)
-            
-            fsize = os.path.getsize(f) / (1024 * 1024 * 1024)
-            th = thumbnail(d)
+            for mtype, func in send_funcs.items():
+                if as_video if mtype == 'video' else getattr(m, mtype, None):
+                    sent = await paced(func, LOG_GROUP, f, thumb=th if mtype == 'video' else None, 
+                                    duration=dur if mtype == 'video' else None,
+                                    height=h if mtype == 'video' else None,
+                                    width=w if mtype == 'video' else None,
+                                    caption=ft if m.caption and mtype not in ['video_note', 'voice'] else None, 
+                                    reply_to_message_id=rtmid, progress=prog, progress_args=(c, d, p.id, st))
+                    break
+            else:
+                sent = await paced(Y.send_document, LOG_GROUP, f, thumb=th, caption=ft if m.caption else None,
+                                            reply_to_message_id=rtmid, progress=prog, progress_args=(c, d, p.id, st))
+            if not sent:
+                discard(f)
+                check_cancel(d)
             
-            if fsize > 2 and Y:
-                st = time.time()
-                await c.edit_message_text(d, p.id, 'File is larger than 2GB. Using alternative method...')
-                await upd_dlg(Y)
-                mtd = await get_video_metadata(f)
-                dur, h, w = mtd['duration'], mtd['width'], mtd['height']
-                th = await screenshot(f, dur, d)
-                
-                send_funcs = {'video': Y.send_video, 'video_note': Y.send_video_note, 
-                            'voice': Y.send_voice, 'audio': Y.send_audio, 
-                            'photo': Y.send_photo, 'document': Y.send_document}
-                
-                for mtype, func in send_funcs.items():
-                    if f.endswith('.mp4'): mtype = 'video'
-                    if getattr(m, mtype, None):
-                        sent = await func(LOG_GROUP, f, thumb=th if mtype == 'video' else None, 
-                                        duration=dur if mtype == 'video' else None,
-                                        height=h if mtype == 'video' else None,
-                                        width=w if mtype == 'video' else None,
-                                        caption=ft if m.caption and mtype not in ['video_note', 'voice'] else None, 
-                                        reply_to_message_id=rtmid, progress=prog, progress_args=(c, d, p.id, st))
-                        break
-                else:
-                    sent = await Y.send_document(LOG_GROUP, f, thumb=th, caption=ft if m.caption else None,
-                                                reply_to_message_id=rtmid, progress=prog, progress_args=(c, d, p.id, st))
-                
-                await c.copy_message(d, LOG_GROUP, sent.id)
-                os.remove(f)
-                await c.delete_messages(d, p.id)
-                
-                return 'Done (Large file).'
+            await turn()
+            await paced(c.copy_message, d, LOG_GROUP, sent.id)
+            if J.get('fu'): asyncio.ensure_future(store(Y, J['fu'], sent, media_of(m).file_size))
+            discard(f)
+            await drop_status(c, J)
             
-            await c.edit_message_text(d, p.id, 'Uploading...')
-            st = time.time()
+            return 'Done (Large file).'
+        
+        await paced(c.edit_message_text, d, p.id, 'Uploading...')
+        st = time.time()
+        sent = None
+        fast = not mem and UP_WORKERS > 1 and os.path.getsize(f) >= FAST_UP_MIN
 
-            try:
-                video_extensions = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.ogv']
-                audio_extensions = ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus', '.aiff', '.ac3']
-                file_ext = os.path.splitext(f)[1].lower()
-                if m.video or (m.document and file_ext in video_extensions):
-                    mtd = await get_video_metadata(f)
-                    dur, h, w = mtd['duration'], mtd['width'], mtd['height']
-                    th = await screenshot(f, dur, d)
-                    await c.send_video(tcid, video=f, caption=ft if m.caption else None, 
+        try:
+            audio_extensions = ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a', '.opus', '.aiff', '.ac3']
+            if as_video:
+                dur, w, h, th = await video_meta(m, f, th, d)
+                if fast:
+                    sent = await send_parallel(c, J, f, 'video', st, turn, thumb=th, width=w, height=h, duration=dur)
+                else:
+                    await turn()
+                    sent = await paced(c.send_video, tcid, video=f, caption=ft if m.caption else None, 
                                     thumb=th, width=w, height=h, duration=dur, 
                                     progress=prog, progress_args=(c, d, p.id, st), 
                                     reply_to_message_id=rtmid)
-                elif m.video_note:
-                    await c.send_video_note(tcid, video_note=f, progress=prog, 
-                                        progress_args=(c, d, p.id, st), reply_to_message_id=rtmid)
-                elif m.voice:
-                    await c.send_voice(tcid, f, progress=prog, progress_args=(c, d, p.id, st), 
-                                    reply_to_message_id=rtmid)
-                elif m.sticker:
-                    await c.send_sticker(tcid, m.sticker.file_id, reply_to_message_id=rtmid)
-                elif m.audio or (m.document and file_ext in audio_extensions):
-                    await c.send_audio(tcid, audio=f, caption=ft if m.caption else None, 
-                                    thumb=th, progress=prog, progress_args=(c, d, p.id, st), 
+            elif fast and (m.video_note or m.voice):
+                kind = 'video_note' if m.video_note else 'voice'
+                sent = await send_parallel(c, J, f, kind, st, turn, duration=getattr(m, kind).duration)
+            elif m.video_note:
+                await turn()
+                sent = await paced(c.send_video_note, tcid, video_note=f, progress=prog, 
+                                    progress_args=(c, d, p.id, st), reply_to_message_id=rtmid)
+            elif m.voice:
+                await turn()
+                sent = await paced(c.send_voice, tcid, f, progress=prog, progress_args=(c, d, p.id, st), 
+                                reply_to_message_id=rtmid)
+            elif m.sticker:
+                await turn()
+                sent = await paced(c.send_sticker, tcid, m.sticker.file_id, reply_to_message_id=rtmid)
+            elif fast and (m.audio or (m.document and ext in audio_extensions)):
+                sent = await send_parallel(c, J, f, 'audio', st, turn, thumb=th,
+                                           duration=m.audio.duration if m.audio else 0,
+                                           performer=m.audio.performer if m.audio else None,
+                                           title=m.audio.title if m.audio else None)
+            elif m.audio or (m.document and ext in audio_extensions):
+                await turn()
+                sent = await paced(c.send_audio, tcid, audio=f, caption=ft if m.caption else None, 
+                                thumb=th, progress=prog, progress_args=(c, d, p.id, st), 
+                                reply_to_message_id=rtmid)
+            elif m.photo:
+                await turn()
+                sent = await paced(c.send_photo, tcid, photo=f, caption=ft if m.caption else None, 
+                                progress=prog, progress_args=(c, d, p.id, st), 
+                                reply_to_message_id=rtmid)
+            elif fast and m.document:
+                sent = await send_parallel(c, J, f, 'document', st, turn)
+            elif m.document:
+                await turn()
+                sent = await paced(c.send_document, tcid, document=f, caption=ft if m.caption else None, 
+                                    progress=prog, progress_args=(c, d, p.id, st), 
                                     reply_to_message_id=rtmid)
-                elif m.photo:
-                    await c.send_photo(tcid, photo=f, caption=ft if m.caption else None, 
+            else:
+                await turn()
+                sent = await paced(c.send_document, tcid, document=f, caption=ft if m.caption else None, 
                                     progress=prog, progress_args=(c, d, p.id, st), 
                                     reply_to_message_id=rtmid)
-                elif m.document:
-                    await c.send_document(tcid, document=f, caption=ft if m.caption else None, 
-                                        progress=prog, progress_args=(c, d, p.id, st), 
-                                        reply_to_message_id=rtmid)
-                else:
-                    await c.send_document(tcid, document=f, caption=ft if m.caption else None, 
-                                        progress=prog, progress_args=(c, d, p.id, st), 
-                                        reply_to_message_id=rtmid)
-            except Exception as e:
-                await c.edit_message_text(d, p.id, f'Upload failed: {str(e)[:30]}')
-                if os.path.exists(f): os.remove(f)
-                return 'Failed.'
-            
-            os.remove(f)
-            await c.delete_messages(d, p.id)
-            
-            return 'Done.'
-            
-        elif m.text:
-            await c.send_message(tcid, text=m.text.markdown, reply_to_message_id=rtmid)
-            return 'Sent.'
+        except StopTransmission:
+            discard(f)
+            raise
+        except Exception as e:
+            await paced(c.edit_message_text, d, p.id, f'Upload failed: {str(e)[:30]}')
+            discard(f)
+            return 'Failed.'
+        
+        discard(f)
+        if not sent: check_cancel(d)
+        await drop_status(c, J)
+        if J.get('fu') and sent: asyncio.ensure_future(store(c, J['fu'], sent, media_of(m).file_size, X))
+        
+        return 'Done.'
+        
+    elif m.text:
+        await turn()
+        await paced(c.send_message, tcid, text=m.text.markdown, reply_to_message_id=rtmid)
+        return 'Sent.'
+
+def discard(f):
+    if isinstance(f, str):
+        if os.path.exists(f): os.remove(f)
+        if os.path.basename(os.path.dirname(os.path.dirname(f))) == 'downloads':
+            try: os.rmdir(os.path.dirname(f))  # job folder of job_path, once empty
+            except OSError: pass
+    elif f is not None:
+        f.close()
+
+def drop_msg(J):
+    # leftovers of a job that was fetched/downloaded but never delivered
+    if isinstance(J, dict):
+        discard(J.get('f'))
+        discard(J.get('th'))
+
+async def drop_status(c, J):
+    # an album's shared status message is removed by up_album once the whole album is out
+    if J.get('p') and not J.get('album'):
+        await paced(c.delete_messages, J['d'], J['p'].id)
+
+async def cancelled(c, J):
+    drop_msg(J)
+    if isinstance(J, dict) and J.get('p') and not J.get('album'):
+        try: await paced(c.delete_messages, J['d'], J['p'].id)
+        except: pass
+    return 'Cancelled.'
+
+async def process_msg(c, u, m, d, lt, uid, i, ud, on_hold=None):
+    J = None
+    try:
+        J = await dl_msg(c, u, m, d, lt, uid, i, ud, on_hold=on_hold)
+        return await up_msg(c, J)
+    except StopTransmission:
+        return await cancelled(c, J)
     except Exception as e:
+        if J: drop_msg(J)
         return f'Error: {str(e)[:50]}'
         
 @X.on_message(filters.command(['batch', 'single']))
@@ -413,12 +880,29 @@ async def process_cmd(c, m):
     Z[uid] = {'step': 'start' if cmd == 'batch' else 'start_single'}
     await pro.edit(f'Send {"start link..." if cmd == "batch" else "link you to process"}.')
 
+async def cancel_ack(ack, uid):
+    st = time.monotonic()
+    while is_user_active(uid) and time.monotonic() - st < 60:
+        await asyncio.sleep(0.5)
+    if is_user_active(uid) and (cancel(('batch', uid)) or cancel(('single', uid))):
+        # a transfer that ignored the request is stopped hard, its task's finally clears the job
+        await asyncio.sleep(1)
+    if is_user_active(uid):
+        await ack.edit('Cancellation requested. The current task is still stopping.')
+    else:
+        await ack.edit(f'Cancelled. Worker freed in {time.monotonic() - st:.1f}s.')
+
 @X.on_message(filters.command(['cancel', 'stop']))
 async def cancel_cmd(c, m):
     uid = m.from_user.id
-    if is_user_active(uid):
+    if is_user_active(uid) and not (running(('batch', uid)) or running(('single', uid))):
+        # nothing is running for this entry any more, drop it instead of waiting for it
+        await remove_active_batch(uid)
+        await m.reply_text('Cancelled.')
+    elif is_user_active(uid):
         if await request_batch_cancel(uid):
-            await m.reply_text('Cancellation requested. The current batch will stop after the current download completes.')
+            ack = await m.reply_text('Cancelling, stopping running transfers...')
+            spawn(('cancel', uid), cancel_ack(ack, uid))
         else:
             await m.reply_text('Failed to request cancellation. Please try again.')
     else:
@@ -426,7 +910,7 @@ async def cancel_cmd(c, m):
 
 @X.on_message(filters.text & filters.private & ~login_in_progress & ~filters.command([
     'start', 'batch', 'cancel', 'login', 'logout', 'stop', 'set', 
-    'pay', 'redeem', 'gencode', 'single', 'generate', 'keyinfo', 'encrypt', 'decrypt', 'keys', 'setbot', 'rembot']))
+    'pay', 'redeem', 'gencode', 'single', 'generate', 'keyinfo', 'encrypt', 'decrypt', 'keys', 'setbot', 'rembot', 'rates', 'cache', 'queue']))
 async def text_handler(c, m):
     uid = m.from_user.id
     if uid not in Z: return
@@ -475,17 +959,20 @@ async def text_handler(c, m):
             Z.pop(uid, None)
             return
 
-        try:
-            msg = await get_msg(ubot, uc, i, s, lt)
-            if msg:
-                res = await process_msg(ubot, uc, msg, str(m.chat.id), lt, uid, i)
-                await pt.edit(f'1/1: {res}')
-            else:
-                await pt.edit('Message not found')
-        except Exception as e:
-            await pt.edit(f'Error: {str(e)[:50]}')
-        finally:
-            Z.pop(uid, None)
+        await add_active_batch(uid, {
+            "kind": "single",
+            "cid": i,
+            "sid": s,
+            "lt": lt,
+            "did": str(m.chat.id),
+            "total": 1,
+            "current": 0,
+            "success": 0,
+            "cancel_requested": False,
+            "progress_message_id": pt.id
+            })
+
+        spawn(('single', uid), run_single(c, uid, str(m.chat.id), pt.id, ubot, uc, i, s, lt))
 
     elif s == 'count':
         if not m.text.isdigit():
@@ -493,7 +980,8 @@ async def text_handler(c, m):
             return
         
         count = int(m.text)
-        maxlimit = PREMIUM_LIMIT if await is_premium_user(uid) else FREEMIUM_LIMIT
+        premium = await is_premium_user(uid)
+        maxlimit = PREMIUM_LIMIT if premium else FREEMIUM_LIMIT
 
         if count > maxlimit:
             await m.reply_text(f'Maximum limit is {maxlimit}.')
@@ -501,7 +989,6 @@ async def text_handler(c, m):
 
         Z[uid].update({'step': 'process', 'did': str(m.chat.id), 'num': count})
         i, s, n, lt = Z[uid]['cid'], Z[uid]['sid'], Z[uid]['num'], Z[uid]['lt']
-        success = 0
 
         pt = await m.reply_text('Processing batch...')
         uc = await get_uclient(uid)
@@ -518,6 +1005,11 @@ async def text_handler(c, m):
             return
         
         await add_active_batch(uid, {
+            "kind": "batch",
+            "cid": i,
+            "sid": s,
+            "lt": lt,
+            "did": str(m.chat.id),
             "total": n,
             "current": 0,
             "success": 0,
@@ -525,36 +1017,219 @@ async def text_handler(c, m):
             "progress_message_id": pt.id
             })
         
-        try:
-            for j in range(n):
-                
+        spawn(('batch', uid), run_batch(c, uid, str(m.chat.id), pt.id, ubot, uc, i, s, n, lt, premium))
+
+async def run_single(c, uid, did, pid, ubot, uc, i, s, lt):
+    async def queued(pos):
+        await skippable(c.edit_message_text, did, pid,
+                        f'Waiting for a free slot, #{pos} in queue...' if pos else 'Processing...')
+
+    async def held(why):
+        await skippable(c.edit_message_text, did, pid, f'Waiting for {why}...' if why else 'Processing...')
+
+    try:
+        premium = await is_premium_user(uid)
+        ud = await get_user_data(int(did))
+        msg = await get_msg(ubot, uc, i, s, lt)
+        if msg:
+            res = await slotted(uid, premium, queued, lambda: process_msg(ubot, uc, msg, did, lt, uid, i, ud, on_hold=held))
+            await paced(c.edit_message_text, did, pid, f'1/1: {res}')
+        else:
+            await paced(c.edit_message_text, did, pid, 'Message not found')
+    except StopTransmission:
+        await paced(c.edit_message_text, did, pid, 'Cancelled.')
+    except Exception as e:
+        await paced(c.edit_message_text, did, pid, f'Error: {str(e)[:50]}')
+    finally:
+        await remove_active_batch(uid)
+        Z.pop(uid, None)
+
+def album_chunks(msgs, size=100):
+    # consecutive ids in groups of up to `size`, never splitting a media group
+    groups = []
+    for x in msgs:
+        if groups and x.media_group_id and groups[-1][0].media_group_id == x.media_group_id:
+            groups[-1].append(x)
+        else:
+            groups.append([x])
+    chunks = [[]]
+    for g in groups:
+        if len(chunks[-1]) + len(g) > size:
+            chunks.append([])
+        chunks[-1].extend(x.id for x in g)
+    return [ch for ch in chunks if ch]
+
+async def bulk_copy(c, ubot, uid, did, pid, i, s, n, lt, start, success, ud):
+    """Copy the batch server-side, 100 messages per call, when nothing has to change on the way.
+
+    Only for public sources the user's bot can read that are not protected, and
+    users without caption rules. Returns the offset and success count reached,
+    the rest (or everything) goes through the download/upload pipeline.
+    """
+    if lt != 'public':
+        return start, success
+    ud = ud or {}
+    if any(ud.get(k) for k in ('caption', 'replacement_words', 'delete_words')):
+        return start, success
+    s = int(s)
+    try:
+        chat = await paced(ubot.get_chat, i)
+        if chat.has_protected_content:
+            return start, success
+        tcid, rtmid = target(ud, did)
+        src, dst = await ubot.resolve_peer(chat.id), await ubot.resolve_peer(tcid)
+        while start < n and not should_cancel(uid):
+            end = min(start + 200, n)
+            msgs = await paced(ubot.get_messages, chat.id, list(range(s + start, s + end)))
+            msgs = [x for x in msgs if x and not x.empty and not x.service]
+            if end < n and msgs and msgs[-1].media_group_id:
+                # album crossing the window edge goes with the next window
+                tail = [x for x in msgs if x.media_group_id == msgs[-1].media_group_id]
+                if tail[0].id - s > start:
+                    end = tail[0].id - s
+                    msgs = msgs[:-len(tail)]
+            for ids in album_chunks(msgs):
                 if should_cancel(uid):
-                    await pt.edit(f'Cancelled at {j}/{n}. Success: {success}')
-                    break
-                
-                await update_batch_progress(uid, j, success)
-                
-                mid = int(s) + j
-                
-                try:
-                    msg = await get_msg(ubot, uc, i, mid, lt)
-                    if msg:
-                        res = await process_msg(ubot, uc, msg, str(m.chat.id), lt, uid, i)
-                        if 'Done' in res or 'Copied' in res or 'Sent' in res:
-                            success += 1
-                    else:
-                        pass
-                except Exception as e:
-                    try: await pt.edit(f'{j+1}/{n}: Error - {str(e)[:30]}')
-                    except: pass
-                
-                await asyncio.sleep(10)
-            
-            if j+1 == n:
-                await m.reply_text(f'Batch Completed ✅ Success: {success}/{n}')
+                    return start, success
+                fwd = dict(top_msg_id=rtmid) if rtmid else {}
+                await paced(ubot.invoke, raw.functions.messages.ForwardMessages(
+                    from_peer=src, id=ids, random_id=[ubot.rnd_id() for _ in ids],
+                    to_peer=dst, drop_author=True, **fwd))
+                success += len(ids)
+                start = ids[-1] - s + 1
+                await update_batch_progress(uid, start, success)
+                await skippable(c.edit_message_text, did, pid, f'Copying batch... {start}/{n}')
+            start = end
+            await update_batch_progress(uid, start, success)
+    except Exception as e:
+        print(f'Bulk copy stopped at {start}/{n}, continuing one by one: {e}')
+    return start, success
+
+async def run_batch(c, uid, did, pid, ubot, uc, i, s, n, lt, premium, start=0, success=0):
+
+    async def queued(pos):
+        await skippable(c.edit_message_text, did, pid,
+                        f'Processing batch... waiting for a free slot, #{pos} in queue.' if pos else 'Processing batch...')
+
+    async def held(why):
+        await skippable(c.edit_message_text, did, pid,
+                        f'Processing batch... waiting for {why}.' if why else 'Processing batch...')
+
+    async def dl_one(msg, status=None):
+        try:
+            J = await slotted(uid, premium, queued, lambda: dl_msg(ubot, uc, msg, did, lt, uid, i, ud,
+                                                                   on_hold=held, status=status))
+        except StopTransmission:
+            return 'Cancelled.'
+        if isinstance(J, dict) and J.get('redo'):
+            # a cached copy that still fails to copy is downloaded again from the upload stage,
+            # which holds no slot: take one like every other download
+            redo = J['redo']
+            J['redo'] = lambda: slotted(uid, premium, queued, redo)
+        return J
+
+    def album_status(size):
+        # created by the first member that needs it, direct and cached albums post none
+        box, lock = {}, asyncio.Lock()
+        async def status():
+            async with lock:
+                if 'p' not in box:
+                    box['p'] = await paced(ubot.send_message, did, f'Downloading album of {size} files...')
+            return box['p']
+        return status
+
+    async def dl(j, msg):
+        if msg == ALBUM:
+            return None  # sent together with the first message of its group
+        if isinstance(msg, list):
+            status = album_status(len(msg))
+            Js = await asyncio.gather(*(dl_one(x, status) for x in msg), return_exceptions=True)
+            return [f'Error: {str(J)[:50]}' if isinstance(J, BaseException) else J for J in Js]
+        return await dl_one(msg)
+
+    async def up(j, J, turn):
+        async def turn_or_stop():
+            # items already waiting for their turn must not go out after /stop
+            await turn()
+            check_cancel(uid)
+
+        turn = turn_or_stop
+        if isinstance(J, list):
+            return await up_album(ubot, J, turn)
+        try:
+            return await up_msg(ubot, J, turn)
+        except StopTransmission:
+            return await cancelled(ubot, J)
+        except Exception:
+            drop_msg(J)
+            raise
+
+    async def done(j, res):
+        nonlocal success
+        for r in res if isinstance(res, list) else [res]:
+            if r and ('Done' in r or 'Copied' in r or 'Sent' in r):
+                success += 1
+            elif r and r.startswith('Error'):
+                try: await c.edit_message_text(did, pid, f'{j+1}/{n}: {r[:40]}')
+                except: pass
+        if 'Cancelled.' not in (res if isinstance(res, list) else [res]):
+            await update_batch_progress(uid, j + 1, success)
+
+    try:
+        ud = await get_user_data(int(did))  # one snapshot of the user's settings for the whole batch
+        start, success = await bulk_copy(c, ubot, uid, did, pid, i, s, n, lt, start, success, ud)
+        W = Window(ubot, uc, i, s, n, lt)
+        finished = await Pipeline(range(start, n), lambda j: W.album(j, start), dl, up, done, stop=lambda: should_cancel(uid),
+                                  prefetch=BATCH_PREFETCH, fetchers=BATCH_FETCHERS,
+                                  downloaders=BATCH_DOWNLOADERS, uploaders=BATCH_UPLOADERS).run()
         
-        finally:
-            await remove_active_batch(uid)
-            Z.pop(uid, None)
+        if finished:
+            await paced(c.send_message, did, f'Batch Completed ✅ Success: {success}/{n}')
+        else:
+            await paced(c.edit_message_text, did, pid, f'Cancelled at {batch_done(uid)}/{n}. Success: {success}')
+    
+    finally:
+        await remove_active_batch(uid)
+        Z.pop(uid, None)
 
+async def resume_job(uid, job):
+    did, n, done = job['did'], job['total'], job.get('current', 0)
+    try:
+        if job.get('cancel_requested'):
+            await remove_active_batch(uid)
+            await paced(X.send_message, did, f'Your task was cancelled while the bot restarted, at {done}/{n}.')
+            return
+        try:
+            ubot = await get_ubot(uid)
+            uc = await get_uclient(uid) if ubot else None
+        except Exception as e:
+            print(f'Cannot restart clients of {uid}: {e}')
+            ubot = uc = None
+        if not ubot or not uc:
+            await remove_active_batch(uid)
+            await paced(X.send_message, did, f'The bot restarted and your task could not be resumed at {done}/{n}. Please start it again.')
+            return
+        pt = await paced(X.send_message, did, f'The bot restarted, resuming your task from {done}/{n}...')
+        job['progress_message_id'] = pt.id
+        await update_batch_progress(uid, done, job.get('success', 0))
+        premium = await is_premium_user(uid)
+    except Exception as e:
+        # e.g. the user blocked the bot; without this the entry would block them after every restart
+        print(f'Cannot resume the task of {uid}: {e}')
+        await remove_active_batch(uid)
+        return
+    if job['kind'] == 'single':
+        await run_single(X, uid, did, pt.id, ubot, uc, job['cid'], job['sid'], job['lt'])
+    else:
+        await run_batch(X, uid, did, pt.id, ubot, uc, job['cid'], job['sid'], n, job['lt'],
+                        premium, start=done, success=job.get('success', 0))
 
+async def run_batch_plugin():
+    # jobs that were running when the bot stopped continue from their last delivered item
+    for key, job in list(ACTIVE_USERS.items()):
+        uid = int(key)
+        if job.get('kind') not in ('batch', 'single') or 'did' not in job:
+            await remove_active_batch(uid)
+            continue
+        print(f'Resuming {job["kind"]} of {uid} at {job.get("current", 0)}/{job["total"]}')
+        spawn((job['kind'], uid), resume_job(uid, job))
@@ -7,6 +7,11 @@ from shared_client import client as bot_client
 from telethon import events
 from utils.func import get_premium_details, is_private_chat, get_display_name, get_user_data, premium_users_collection, is_premium_user
 from config import OWNER_ID
+from utils.governor import rates
+from utils.filecache import cache_stats
+from utils.scheduler import scheduler
+from utils.admission import admission
+from utils.tasks import counts
 import logging
 logging.basicConfig(format=
     '%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
@@ -175,4 +180,65 @@ async def remove_premium_handler(event):
     except Exception as e:
         logger.error(f'Error removing premium from {target_user_id}: {e}')
         await event.respond(f'❌ Error removing premium: {str(e)}')
-        return
\ No newline at end of file
+        return
+
+
+@bot_client.on(events.NewMessage(pattern='/rates'))
+async def rates_handler(event):
+    if event.sender_id not in OWNER_ID:
+        return
+    current = rates()
+    if not current:
+        await event.respond('No client has made paced calls yet.')
+        return
+    lines = [
+        f"**{name}**: {r['rate']}/s, {r['calls']} calls, {r['floods']} FloodWaits, waited {r['waited']}s"
+        + (f", blocked {r['blocked']}s" if r['blocked'] else '')
+        for name, r in current.items()
+    ]
+    await event.respond('**Client rates:**\n\n' + '\n'.join(lines))
+
+
+@bot_client.on(events.NewMessage(pattern='/cache'))
+async def cache_handler(event):
+    if event.sender_id not in OWNER_ID:
+        return
+    st = await cache_stats()
+    lookups = st['hits'] + st['misses']
+    ratio = f"{st['hits'] / lookups * 100:.1f}%" if lookups else '-'
+    text = (
+        '**File cache:**\n\n'
+        f"**Entries:** {st.get('entries', 0)} ({st.get('size', 0) / 1024 ** 3:.2f} GB)\n"
+        f"**Since restart:** {st['hits']} hits, {st['misses']} misses ({ratio}), {st['stored']} stored, {st['evicted']} evicted\n"
+    )
+    if 'total' in st:
+        t = st['total']
+        text += f"**All time:** {t['hits']} hits, {t['misses']} misses, {t['stored']} stored, {t['evicted']} evicted"
+    await event.respond(text)
+
+
+@bot_client.on(events.NewMessage(pattern='/queue'))
+async def queue_handler(event):
+    if event.sender_id not in OWNER_ID:
+        return
+    st = scheduler.stats()
+    ad = admission.snapshot()
+    jobs = counts()
+    gb = lambda n: f"{n / 1024 ** 3:.2f} GB"
+    text = (
+        '**Transfer queue:**\n\n'
+        f"**Running:** {st['running']}/{st['workers']} slots for {st['users']} users\n"
+        f"**Waiting:** {st['waiting']}\n"
+        f"**Started since restart:** {st['served']}\n"
+        f"**Jobs:** {jobs.get('batch', 0)} batch, {jobs.get('single', 0)} single\n\n"
+        '**Admission:**\n\n'
+        f"**Disk:** {gb(ad['free'])} free, {gb(ad['reserved'])} reserved, {gb(ad['headroom'])} headroom\n"
+        f"**Memory:** {ad['rss'] / 1024 ** 2:.0f} MB of {ad['max_rss'] / 1024 ** 2:.0f} MB\n"
+        f"**Open files:** {ad['fds'] if ad['fds'] is not None else '-'} of {ad['max_fds'] or '-'}\n"
+        f"**Waiting for room:** {ad['waiting']}"
+    )
+    if ad['reservations']:
+        text += '\n\n' + '\n'.join(
+            f"`{r['owner']}`: {gb(r['size'])} for {r['age']}s" for r in ad['reservations']
+        )
+    await event.respond(text)
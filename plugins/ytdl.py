@@ -27,9 +27,11 @@ from shared_client import client, app
 from telethon import events
 from telethon.sync import TelegramClient
 from telethon.tl.types import DocumentAttributeVideo
-from utils.func import get_video_metadata, screenshot
+from utils.func import get_video_metadata, screenshot, is_premium_user
+from utils.scheduler import scheduler
+from utils.admission import admission
 from telethon.tl.functions.messages import EditMessageRequest
-from devgagantools import fast_upload
+from utils.upload import fast_upload
 from concurrent.futures import ThreadPoolExecutor
 import aiohttp 
 import logging
@@ -43,6 +45,20 @@ logger = logging.getLogger(__name__)
  
 thread_pool = ThreadPoolExecutor()
 ongoing_downloads = {}
+
+def queue_notice(event):
+    # tells the user where their request is while every transfer slot is busy
+    note = None
+
+    async def on_wait(pos):
+        nonlocal note
+        if pos and note:
+            await note.edit(f"**⏳ All download slots are busy, you are #{pos} in the queue...**")
+        elif pos:
+            note = await event.reply(f"**⏳ All download slots are busy, you are #{pos} in the queue...**")
+        elif note:
+            await note.delete()
+    return on_wait
  
 def d_thumbnail(thumbnail_url, save_path):
     try:
@@ -179,12 +195,13 @@ async def handler(event):
     ongoing_downloads[user_id] = True
  
     try:
-        if "instagram.com" in url:
-            await process_audio(client, event, url, cookies_env_var="INSTA_COOKIES")
-        elif "youtube.com" in url or "youtu.be" in url:
-            await process_audio(client, event, url, cookies_env_var="YT_COOKIES")
-        else:
-            await process_audio(client, event, url)
+        async with scheduler.slot(user_id, await is_premium_user(user_id), queue_notice(event)):
+            if "instagram.com" in url:
+                await process_audio(client, event, url, cookies_env_var="INSTA_COOKIES")
+            elif "youtube.com" in url or "youtu.be" in url:
+                await process_audio(client, event, url, cookies_env_var="YT_COOKIES")
+            else:
+                await process_audio(client, event, url)
     except Exception as e:
         await event.reply(f"**An error occurred:** `{e}`")
     finally:
@@ -229,15 +246,17 @@ async def handler(event):
         return    
  
     url = event.message.text.split()[1]
+    ongoing_downloads[user_id] = True
  
      
     try:
-        if "instagram.com" in url:
-            await process_video(client, event, url, "INSTA_COOKIES", check_duration_and_size=False)
-        elif "youtube.com" in url or "youtu.be" in url:
-            await process_video(client, event, url, "YT_COOKIES", check_duration_and_size=True)
-        else:
-            await process_video(client, event, url, None, check_duration_and_size=False)
+        async with scheduler.slot(user_id, await is_premium_user(user_id), queue_notice(event)):
+            if "instagram.com" in url:
+                await process_video(client, event, url, "INSTA_COOKIES", check_duration_and_size=False)
+            elif "youtube.com" in url or "youtu.be" in url:
+                await process_video(client, event, url, "YT_COOKIES", check_duration_and_size=True)
+            else:
+                await process_video(client, event, url, None, check_duration_and_size=False)
  
     except Exception as e:
         await event.reply(f"**An error occurred:** `{e}`")
@@ -346,22 +365,33 @@ async def process_video(client, event, url, cookies_env_var, check_duration_and_
         'verbose': True,
     }
     prog = None
+    token = None
     progress_message = await event.reply("**__Starting download...__**")
     logger.info("Starting the download process...")
     try:
         info_dict = await fetch_video_info(url, ydl_opts, progress_message, check_duration_and_size)
         if not info_dict:
             return
+
+        async def held(why):
+            await progress_message.edit(f"**__Waiting for {why}...__**" if why else "**__Starting download...__**")
+
+        # taken inside the caller's transfer slot: slot first, then disk, in every plugin
+        # the file is written once and read again in parts when it is split for upload
+        size = info_dict.get('filesize') or info_dict.get('filesize_approx') or 0
+        token = await admission.reserve(size * 2 if size > 2 * 1024 * 1024 else size, event.sender_id, held)
          
         await asyncio.to_thread(download_video, url, ydl_opts)
         title = info_dict.get('title', 'Powered by Team SPY')
-        k = await get_video_metadata(download_path)      
-        W = k['width']
-        H = k['height']
-        D = k['duration']
-        metadata['width'] = info_dict.get('width') or W
-        metadata['height'] = info_dict.get('height') or H
-        metadata['duration'] = int(info_dict.get('duration') or 0) or D
+        metadata['width'] = info_dict.get('width')
+        metadata['height'] = info_dict.get('height')
+        metadata['duration'] = int(info_dict.get('duration') or 0)
+        if not (metadata['width'] and metadata['height'] and metadata['duration']):
+            # yt-dlp did not report everything, read the rest from the file
+            k = await get_video_metadata(download_path)
+            metadata['width'] = metadata['width'] or k['width']
+            metadata['height'] = metadata['height'] or k['height']
+            metadata['duration'] = metadata['duration'] or k['duration']
         thumbnail_url = info_dict.get('thumbnail', None)
         THUMB = None
  
@@ -416,6 +446,7 @@ async def process_video(client, event, url, cookies_env_var, check_duration_and_
         logger.exception("An error occurred during download or upload.")
         await event.reply(f"**__An error occurred: {e}__**")
     finally:
+        admission.release(token)
          
         if os.path.exists(download_path):
             os.remove(download_path)
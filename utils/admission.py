@@ -0,0 +1,118 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import time
+import shutil
+import asyncio
+import logging
+import itertools
+import resource
+import psutil
+from config import DISK_HEADROOM, MAX_RSS, FD_BUDGET
+
+logger = logging.getLogger(__name__)
+
+POLL = 5
+
+
+def _gb(n):
+    return f"{n / 1024 ** 3:.2f} GB"
+
+
+class Admission:
+    """Lets a transfer start only when the scratch volume and the process have room for it.
+
+    A transfer reserves the bytes it is expected to write. It waits while free
+    disk space minus DISK_HEADROOM minus what others already reserved is
+    smaller than that, while RSS is above MAX_RSS, or while open files are
+    above FD_BUDGET of the descriptor limit.
+    """
+
+    def __init__(self, path='.', headroom=DISK_HEADROOM, max_rss=MAX_RSS, fd_budget=FD_BUDGET):
+        self.path = path
+        self.headroom = headroom
+        self.max_rss = max_rss or int(psutil.virtual_memory().total * 0.75)
+        soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        self.max_fds = int(soft * fd_budget) if soft > 0 else 0
+        self.proc = psutil.Process()
+        self.held = {}
+        self.waiting = 0
+        self.seq = itertools.count(1)
+        self.changed = asyncio.Event()
+
+    def reserved(self):
+        return sum(size for _, size, _ in self.held.values())
+
+    def free(self):
+        return shutil.disk_usage(self.path).free - self.headroom - self.reserved()
+
+    def _blocked(self, size):
+        if size and size > self.free():
+            return f"free disk space ({_gb(size)} needed)"
+        if self.proc.memory_info().rss > self.max_rss:
+            return "memory"
+        if self.max_fds and hasattr(self.proc, 'num_fds') and self.proc.num_fds() > self.max_fds:
+            return "open files"
+        return None
+
+    async def reserve(self, size, owner, on_wait=None):
+        """Wait until `size` bytes fit and hold them, return the token for `release`.
+
+        `on_wait(reason)` is called once when the transfer has to wait and
+        with None once it may start.
+        """
+        size = max(int(size or 0), 0)
+        told = False
+        while True:
+            why = self._blocked(size)
+            if why is None:
+                break
+            if size and not self.held and size > shutil.disk_usage(self.path).free - self.headroom:
+                raise IOError(f"Not enough disk space for this file ({_gb(size)})")
+            if on_wait and not told:
+                told = True
+                await on_wait(why)
+            changed = self.changed
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(changed.wait(), POLL)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.waiting -= 1
+        token = next(self.seq)
+        self.held[token] = (owner, size, time.time())
+        if told:
+            try:
+                await on_wait(None)
+            except BaseException:
+                # cancelled during the edit: the caller never gets the token, give it back
+                self.release(token)
+                raise
+        return token
+
+    def release(self, token):
+        if self.held.pop(token, None) is not None:
+            self.changed.set()
+            self.changed = asyncio.Event()
+
+    def snapshot(self):
+        usage = shutil.disk_usage(self.path)
+        return {
+            'free': usage.free,
+            'headroom': self.headroom,
+            'reserved': self.reserved(),
+            'reservations': [
+                {'owner': owner, 'size': size, 'age': int(time.time() - since)}
+                for owner, size, since in self.held.values()
+            ],
+            'waiting': self.waiting,
+            'rss': self.proc.memory_info().rss,
+            'max_rss': self.max_rss,
+            'fds': self.proc.num_fds() if hasattr(self.proc, 'num_fds') else None,
+            'max_fds': self.max_fds,
+        }
+
+
+admission = Admission()
@@ -0,0 +1,202 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import json
+import math
+import asyncio
+import logging
+from pyrogram import raw, StopTransmission
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Session, Auth
+from pyrogram.errors import AuthBytesInvalid, FloodWait, FileReferenceExpired
+from config import DL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Counterpart of fast_upload for downloads: the file is split in 1 MB
+# chunks, fetched with upload.GetFile over several media sessions at once,
+# and every chunk is written at its own offset of a preallocated file.
+
+CHUNK_SIZE = 1024 * 1024
+CHUNK_RETRIES = 5
+SAVE_EVERY = 16  # chunks between checkpoints of the .state file
+
+sessions = {}
+sessions_lock = asyncio.Lock()
+
+
+async def _new_session(client, dc_id):
+    test_mode = await client.storage.test_mode()
+    if dc_id == await client.storage.dc_id():
+        session = Session(client, dc_id, await client.storage.auth_key(), test_mode, is_media=True)
+        await session.start()
+        return session
+
+    session = Session(client, dc_id, await Auth(client, dc_id, test_mode).create(), test_mode, is_media=True)
+    await session.start()
+    for _ in range(3):
+        exported = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+        try:
+            await session.invoke(raw.functions.auth.ImportAuthorization(id=exported.id, bytes=exported.bytes))
+            return session
+        except AuthBytesInvalid:
+            continue
+    await session.stop()
+    raise AuthBytesInvalid
+
+
+async def get_sessions(client, dc_id, count):
+    """Media sessions of `client` on `dc_id`, kept open and reused between downloads."""
+    key = (client.name, dc_id)
+    async with sessions_lock:
+        pool = sessions.setdefault(key, [])
+        while len(pool) < count:
+            pool.append(await _new_session(client, dc_id))
+        return pool[:count]
+
+
+def file_location(file_id):
+    if file_id.file_type == FileType.PHOTO:
+        return raw.types.InputPhotoFileLocation(
+            id=file_id.media_id, access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference, thumb_size=file_id.thumbnail_size
+        )
+    return raw.types.InputDocumentFileLocation(
+        id=file_id.media_id, access_hash=file_id.access_hash,
+        file_reference=file_id.file_reference, thumb_size=file_id.thumbnail_size
+    )
+
+
+class Unsupported(IOError):
+    """The chunked engine cannot fetch this file at all (e.g. it is served through a CDN)."""
+
+
+def _load_state(path, size, uid):
+    try:
+        with open(path + '.state') as f:
+            st = json.load(f)
+        if st.get('size') == size and st.get('id') == uid and os.path.getsize(path) == size:
+            return set(st.get('done', []))
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _save_state(path, size, uid, done):
+    tmp = path + '.state.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'size': size, 'id': uid, 'done': sorted(done)}, f)
+    os.replace(tmp, path + '.state')
+
+
+def discard_partial(path):
+    for p in (path, path + '.state'):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+async def fast_download(client, media, path, workers=DL_WORKERS, progress=None, progress_args=(), refresh=None):
+    """Download `media` (a Video/Document/Audio/... object) to `path` over `workers` sessions.
+
+    Finished chunks are recorded in `path`.state, so a later call for the same
+    path continues where a failed one stopped. `refresh()` must return the
+    media again from a re-fetched message; it is used when the file
+    reference expires mid-download.
+    """
+    size = media.file_size
+    uid = media.file_unique_id
+    file_id = FileId.decode(media.file_id)
+    location = file_location(file_id)
+    chunks = math.ceil(size / CHUNK_SIZE)
+    pool = await get_sessions(client, file_id.dc_id, max(1, min(workers, chunks)))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    have = _load_state(path, size, uid)
+    if have is None:
+        have = set()
+        with open(path, 'wb') as fp:
+            fp.truncate(size)
+    elif have:
+        logger.info(f"Resuming {path} at {len(have)}/{chunks} chunks")
+
+    queue = asyncio.Queue()
+    for k in range(chunks):
+        if k not in have:
+            queue.put_nowait(k)
+    done = sum(min(CHUNK_SIZE, size - k * CHUNK_SIZE) for k in have)
+    fd = os.open(path, os.O_WRONLY)
+    refreshing = asyncio.Lock()
+
+    async def renew(stale):
+        nonlocal location
+        async with refreshing:
+            if location is stale and refresh:
+                fresh = await refresh()
+                location = file_location(FileId.decode(fresh.file_id))
+        return location is not stale
+
+    async def fetch(session, k):
+        for attempt in range(CHUNK_RETRIES):
+            loc = location
+            try:
+                return await session.invoke(
+                    raw.functions.upload.GetFile(location=loc, offset=k * CHUNK_SIZE, limit=CHUNK_SIZE)
+                )
+            except FileReferenceExpired:
+                if not await renew(loc):
+                    raise
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt == CHUNK_RETRIES - 1:
+                    raise
+                logger.warning(f"Chunk {k} of {path} failed ({e}), retrying")
+                await asyncio.sleep(1)
+        raise IOError(f"Chunk {k} of {path} failed {CHUNK_RETRIES} times")
+
+    async def write(data, offset):
+        # a cancelled await does not stop the thread, wait for it so fd is never closed under a write
+        w = asyncio.ensure_future(asyncio.to_thread(os.pwrite, fd, data, offset))
+        try:
+            await asyncio.shield(w)
+        except asyncio.CancelledError:
+            await w
+            raise
+
+    async def worker(session):
+        nonlocal done
+        while not queue.empty():
+            k = queue.get_nowait()
+            r = await fetch(session, k)
+            if not isinstance(r, raw.types.upload.File):
+                raise Unsupported(f"Unsupported GetFile answer {type(r).__name__}")
+            await write(r.bytes, k * CHUNK_SIZE)
+            have.add(k)
+            done += len(r.bytes)
+            if len(have) % SAVE_EVERY == 0:
+                await asyncio.to_thread(_save_state, path, size, uid, set(have))
+            if progress:
+                await progress(min(done, size), size, *progress_args)
+
+    tasks = [asyncio.ensure_future(worker(s)) for s in pool]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException as e:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        os.close(fd)
+        fd = None
+        if isinstance(e, (StopTransmission, asyncio.CancelledError)):
+            discard_partial(path)
+        else:
+            _save_state(path, size, uid, have)
+        raise
+    finally:
+        if fd is not None:
+            os.close(fd)
+    if os.path.exists(path + '.state'):
+        os.remove(path + '.state')
+    return path
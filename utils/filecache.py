@@ -0,0 +1,121 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import logging
+from datetime import datetime
+from config import LOG_GROUP, FILE_CACHE_GB
+from utils.func import file_cache_collection, statistics_collection, has_rename_rules
+
+logger = logging.getLogger(__name__)
+
+# file_unique_id of a source file -> a copy of it stored in LOG_GROUP, so the
+# next user asking for the same post gets a copy_message instead of a full
+# download and upload.
+
+MEDIA_TYPES = ('video', 'audio', 'document', 'photo', 'voice', 'video_note', 'animation', 'sticker')
+COUNTERS = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+
+def media_of(m):
+    for attr in MEDIA_TYPES:
+        media = getattr(m, attr, None)
+        if media:
+            return media
+    return None
+
+
+def unique_id(m):
+    media = media_of(m)
+    return getattr(media, 'file_unique_id', None) if media else None
+
+
+def cacheable(user_data, thumb=None):
+    # stored copies carry the file name and thumbnail of the first upload
+    if not FILE_CACHE_GB or thumb:
+        return False
+    return not has_rename_rules(user_data)
+
+
+async def _count(key):
+    COUNTERS[key] += 1
+    try:
+        await statistics_collection.update_one({"_id": "file_cache"}, {"$inc": {key: 1}}, upsert=True)
+    except Exception as e:
+        logger.error(f"Error updating file cache counters: {e}")
+
+
+async def lookup(fuid):
+    try:
+        doc = await file_cache_collection.find_one_and_update(
+            {"_id": fuid},
+            {"$set": {"last_used": datetime.now()}, "$inc": {"hits": 1}}
+        )
+    except Exception as e:
+        logger.error(f"Error reading file cache: {e}")
+        doc = None
+    await _count('hits' if doc else 'misses')
+    return doc
+
+
+async def forget(fuid):
+    try:
+        await file_cache_collection.delete_one({"_id": fuid})
+    except Exception as e:
+        logger.error(f"Error removing {fuid} from file cache: {e}")
+
+
+async def store(client, fuid, sent, size, owner=None):
+    """Keep `sent` in LOG_GROUP (copying it there if needed) and index it by `fuid`.
+
+    `client` is the one that sent `sent`. `owner` administers LOG_GROUP and
+    evicts old copies, whoever stored them (defaults to `client`).
+    """
+    try:
+        kept = sent
+        if sent.chat.id != LOG_GROUP:
+            kept = await client.copy_message(LOG_GROUP, sent.chat.id, sent.id)
+        now = datetime.now()
+        await file_cache_collection.update_one(
+            {"_id": fuid},
+            {"$set": {"chat_id": LOG_GROUP, "message_id": kept.id, "size": size or 0,
+                      "created": now, "last_used": now, "hits": 0}},
+            upsert=True
+        )
+        await _count('stored')
+        await evict(owner or client)
+    except Exception as e:
+        logger.error(f"Error storing {fuid} in file cache: {e}")
+
+
+async def evict(client):
+    limit = FILE_CACHE_GB * 1024 ** 3
+    total = 0
+    async for row in file_cache_collection.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size"}}}]):
+        total = row["size"]
+    if total <= limit:
+        return
+    async for doc in file_cache_collection.find().sort("last_used", 1):
+        if total <= limit:
+            break
+        try:
+            await client.delete_messages(doc["chat_id"], doc["message_id"])
+        except Exception as e:
+            logger.warning(f"Could not delete cached copy {doc['message_id']}: {e}")
+        await file_cache_collection.delete_one({"_id": doc["_id"]})
+        total -= doc.get("size", 0)
+        await _count('evicted')
+
+
+async def cache_stats():
+    stats = dict(COUNTERS)
+    try:
+        stats['entries'] = await file_cache_collection.count_documents({})
+        async for row in file_cache_collection.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size"}}}]):
+            stats['size'] = row["size"]
+        saved = await statistics_collection.find_one({"_id": "file_cache"})
+        if saved:
+            stats['total'] = {k: saved.get(k, 0) for k in COUNTERS}
+    except Exception as e:
+        logger.error(f"Error reading file cache stats: {e}")
+    return stats
@@ -0,0 +1,65 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import shutil
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one running call.
+
+    Everyone who joins while the call is running gets the same result. When
+    the last caller leaves, `release(result)` cleans up, and a call nobody
+    waits for anymore is cancelled.
+    """
+
+    def __init__(self, release=None):
+        self.calls = {}
+        self.release = release
+
+    def running(self, key):
+        return key in self.calls
+
+    @asynccontextmanager
+    async def join(self, key, fn):
+        call = self.calls.get(key)
+        if call is None:
+            call = self.calls[key] = {'task': asyncio.ensure_future(fn()), 'refs': 0}
+        call['refs'] += 1
+        try:
+            yield await asyncio.shield(call['task'])
+        finally:
+            call['refs'] -= 1
+            if call['refs'] == 0:
+                if self.calls.get(key) is call:
+                    self.calls.pop(key)
+                task = call['task']
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None and self.release:
+                    try:
+                        self.release(task.result())
+                    except Exception as e:
+                        logger.error(f"Error releasing result of {key}: {e}")
+
+
+def remove_file(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+async def private_copy(path, own):
+    """Give one caller its own file `own` of a shared download (hard link, copy as fallback)."""
+    os.makedirs(os.path.dirname(own) or '.', exist_ok=True)
+    try:
+        os.link(path, own)
+    except OSError:
+        # no hard links on this volume, a full copy must not stall the event loop
+        await asyncio.to_thread(shutil.copyfile, path, own)
+    return own
@@ -2,16 +2,15 @@
 # Licensed under the GNU General Public License v3.0.  
 # See LICENSE file in the repository root for full license text.
 
-import concurrent.futures
 import time
 import os
 import re
-import cv2
 import logging
-import asyncio
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import MONGO_DB as MONGO_URI, DB_NAME
+from utils.probe import probe
+from utils import thumbs
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,6 +25,8 @@ users_collection = db["users"]
 premium_users_collection = db["premium_users"]
 statistics_collection = db["statistics"]
 codedb = db["redeem_code"]
+peers_collection = db["peers"]
+file_cache_collection = db["file_cache"]
 
 # ------- < start > Session Encoder don't change -------
 
@@ -52,10 +53,6 @@ def thumbnail(sender):
     return f'{sender}.jpg' if os.path.exists(f'{sender}.jpg') else None
 
 
-def hhmmss(seconds):
-    return time.strftime('%H:%M:%S', time.gmtime(seconds))
-
-
 def E(L):   
     private_match = re.match(r'https://t\.me/c/(\d+)/(?:\d+/)?(\d+)', L)
     public_match = re.match(r'https://t\.me/([^/]+)/(?:\d+/)?(\d+)', L)
@@ -185,93 +182,54 @@ async def remove_user_bot(user_id):
         return False
 
 
+def has_rename_rules(user_data):
+    return any((user_data or {}).get(k) for k in ("rename_tag", "delete_words", "replacement_words"))
+
+
+def apply_text_rules(user_data, text):
+    """The user's replacement and delete words applied to `text`, from already fetched user data."""
+    if not text:
+        return ""
+    user_data = user_data or {}
+    processed_text = text
+    for word, replacement in user_data.get("replacement_words", {}).items():
+        processed_text = processed_text.replace(word, replacement)
+    
+    delete_words = user_data.get("delete_words", [])
+    if delete_words:
+        words = processed_text.split()
+        filtered_words = [w for w in words if w not in delete_words]
+        processed_text = " ".join(filtered_words)
+    
+    return processed_text
+
+
 async def process_text_with_rules(user_id, text):
     if not text:
         return ""
     
     try:
-        replacements = await get_user_data_key(user_id, "replacement_words", {})
-        delete_words = await get_user_data_key(user_id, "delete_words", [])
-        
-        processed_text = text
-        for word, replacement in replacements.items():
-            processed_text = processed_text.replace(word, replacement)
-        
-        if delete_words:
-            words = processed_text.split()
-            filtered_words = [w for w in words if w not in delete_words]
-            processed_text = " ".join(filtered_words)
-        
-        return processed_text
+        return apply_text_rules(await users_collection.find_one({"user_id": int(user_id)}), text)
     except Exception as e:
         logger.error(f"Error processing text with rules: {e}")
         return text
 
 
-async def screenshot(video: str, duration: int, sender: str) -> str | None:
+async def screenshot(video: str, duration: int, sender: str):
+    """The user's own thumbnail path, else a keyframe of `video` as an in-memory JPEG, else None."""
     existing_screenshot = f"{sender}.jpg"
     if os.path.exists(existing_screenshot):
         return existing_screenshot
-
-    time_stamp = hhmmss(duration // 2)
-    output_file = datetime.now().isoformat("_", "seconds") + ".jpg"
-
-    cmd = [
-        "ffmpeg",
-        "-ss", time_stamp,
-        "-i", video,
-        "-frames:v", "1",
-        output_file,
-        "-y"
-    ]
-
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    
-    stdout, stderr = await process.communicate()
-
-    if os.path.isfile(output_file):
-        return output_file
-    else:
-        print(f"FFmpeg Error: {stderr.decode().strip()}")
-        return None
+    return await thumbs.thumb(video, duration)
 
 
 async def get_video_metadata(file_path):
     default_values = {'width': 1, 'height': 1, 'duration': 1}
-    loop = asyncio.get_event_loop()
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
-    
     try:
-        def _extract_metadata():
-            try:
-                vcap = cv2.VideoCapture(file_path)
-                if not vcap.isOpened():
-                    return default_values
-
-                width = round(vcap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = round(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps = vcap.get(cv2.CAP_PROP_FPS)
-                frame_count = vcap.get(cv2.CAP_PROP_FRAME_COUNT)
-
-                if fps <= 0:
-                    return default_values
-
-                duration = round(frame_count / fps)
-                if duration <= 0:
-                    return default_values
-
-                vcap.release()
-                return {'width': width, 'height': height, 'duration': duration}
-            except Exception as e:
-                logger.error(f"Error in video_metadata: {e}")
-                return default_values
-        
-        return await loop.run_in_executor(executor, _extract_metadata)
-        
+        info = await probe(file_path)
+        if not info or not info['duration']:
+            return default_values
+        return {'width': info['width'] or 1, 'height': info['height'] or 1, 'duration': info['duration']}
     except Exception as e:
         logger.error(f"Error in get_video_metadata: {e}")
         return default_values
@@ -0,0 +1,141 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import time
+import asyncio
+import logging
+from pyrogram.errors import FloodWait
+from config import PACE_RATE, PACE_BURST, FLOOD_RETRIES
+
+logger = logging.getLogger(__name__)
+
+MIN_RATE = 0.05
+
+
+class Bucket:
+    """Token bucket for one client.
+
+    Starts at PACE_RATE calls/s. Every FloodWait halves the rate and blocks the
+    bucket for the time Telegram asked for; every successful call gives back a
+    little rate until the ceiling is reached again.
+    """
+
+    def __init__(self, name, rate=PACE_RATE, burst=PACE_BURST):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.until = 0
+        self.calls = 0
+        self.floods = 0
+        self.waited = 0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = self._refill()
+                if now < self.until:
+                    delay = self.until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    self.calls += 1
+                    return
+                else:
+                    delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def try_acquire(self):
+        now = self._refill()
+        if now < self.until or self.tokens < 1 or self.lock.locked():
+            return False
+        self.tokens -= 1
+        self.calls += 1
+        return True
+
+    def flood(self, seconds):
+        self.floods += 1
+        self.rate = max(MIN_RATE, self.rate / 2)
+        self.tokens = 0
+        self.until = max(self.until, time.monotonic() + seconds)
+        logger.warning(f"FloodWait {seconds}s on {self.name}, pacing at {self.rate:.2f}/s")
+
+    def success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def snapshot(self):
+        return {
+            'rate': round(self.rate, 2),
+            'calls': self.calls,
+            'floods': self.floods,
+            'waited': round(self.waited, 1),
+            'blocked': max(0, round(self.until - time.monotonic())),
+        }
+
+
+buckets = {}
+
+
+def bucket(client):
+    name = getattr(client, 'name', None) or str(id(client))
+    if name not in buckets:
+        buckets[name] = Bucket(name)
+    return buckets[name]
+
+
+def flood_seconds(e):
+    return int(getattr(e, 'value', None) or getattr(e, 'x', 0) or 1)
+
+
+def _client(fn, args):
+    # bound client methods, or helpers that take the client as first argument
+    return getattr(fn, '__self__', None) or args[0]
+
+
+async def paced(fn, *args, **kwargs):
+    """Await `fn(*args, **kwargs)` paced by the bucket of the client `fn` is bound to.
+
+    Pyrogram sleeps through FloodWaits up to the client's sleep_threshold
+    (10 s by default) without raising, so only clients built with
+    sleep_threshold=0 (the per-user bots and sessions) report every wait here.
+    """
+    b = bucket(_client(fn, args))
+    for attempt in range(FLOOD_RETRIES + 1):
+        await b.acquire()
+        try:
+            result = await fn(*args, **kwargs)
+            b.success()
+            return result
+        except FloodWait as e:
+            b.flood(flood_seconds(e))
+            if attempt == FLOOD_RETRIES:
+                raise
+
+
+async def skippable(fn, *args, **kwargs):
+    """Like `paced` but for cosmetic calls (progress edits): skip instead of waiting."""
+    b = bucket(_client(fn, args))
+    if not b.try_acquire():
+        return None
+    try:
+        result = await fn(*args, **kwargs)
+        b.success()
+        return result
+    except FloodWait as e:
+        b.flood(flood_seconds(e))
+        return None
+
+
+def rates():
+    return {name: b.snapshot() for name, b in buckets.items()}
@@ -0,0 +1,115 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLUSH_EVERY = 1.0  # seconds between batched writes
+COMPACT_MIN = 1000  # records before the file is worth compacting
+
+
+def _lines(items):
+    # serialized on the event loop, the values are live dicts that keep changing
+    return ''.join(json.dumps({'k': k, 'v': v}) + '\n' for k, v in items.items())
+
+
+class Journal:
+    """Append-only key/value log for job state.
+
+    Every change is one JSON line `{"k": key, "v": value}` (`v` null deletes).
+    Changes are coalesced per key and written by a single background task
+    once per FLUSH_EVERY with one fsync, so callers never block on disk.
+    When the file holds many more records than live keys it is rewritten
+    with just the current state.
+    """
+
+    def __init__(self, path, legacy=None):
+        self.path = path
+        self.legacy = legacy
+        self.state = {}
+        self.pending = {}
+        self.records = 0
+        self.wake = asyncio.Event()
+        self.task = None
+
+    def load(self):
+        """Replay the log (or the old single-JSON file) and return the current state."""
+        if os.path.exists(self.path):
+            torn = False
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        torn = True  # last line of a crash, rewrite so appends start clean
+                        continue
+                    self.records += 1
+                    if r.get('v') is None:
+                        self.state.pop(r['k'], None)
+                    else:
+                        self.state[r['k']] = r['v']
+            if torn:
+                self._compact(_lines(self.state), len(self.state))
+        elif self.legacy and os.path.exists(self.legacy):
+            try:
+                with open(self.legacy, 'r') as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                logger.error(f"Cannot read {self.legacy}: {e}")
+            self._compact(_lines(self.state), len(self.state))
+            os.remove(self.legacy)
+        return dict(self.state)
+
+    def put(self, key, value):
+        self.state[key] = value
+        self.pending[key] = value
+        self._kick()
+
+    def delete(self, key):
+        self.state.pop(key, None)
+        self.pending[key] = None
+        self._kick()
+
+    def _kick(self):
+        self.wake.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._writer())
+
+    async def _writer(self):
+        while True:
+            await self.wake.wait()
+            await asyncio.sleep(FLUSH_EVERY)
+            self.wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Journal write to {self.path} failed: {e}")
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        await asyncio.to_thread(self._append, _lines(batch))
+        self.records += len(batch)
+        if self.records > max(COMPACT_MIN, 4 * len(self.state)):
+            await asyncio.to_thread(self._compact, _lines(self.state), len(self.state))
+
+    def _append(self, lines):
+        with open(self.path, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self, lines, count):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.records = count
@@ -0,0 +1,57 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import io
+import logging
+from utils.func import thumbnail, get_video_metadata, screenshot
+from utils.governor import paced
+
+logger = logging.getLogger(__name__)
+
+# Video attributes and thumbnails come from the source message whenever it
+# has them: duration/width/height are on m.video and Telegram keeps small
+# thumbnails next to every video. Decoding the file (get_video_metadata) or
+# grabbing a frame with ffmpeg (screenshot) is only the fallback.
+
+
+async def source_thumb(u, media, d):
+    """Bytes of the user's own thumbnail, else of the smallest source thumbnail, else None."""
+    th = thumbnail(d)
+    if th:
+        with open(th, 'rb') as fp:
+            return fp.read()
+    thumbs = getattr(media, 'thumbs', None)
+    if thumbs:
+        try:
+            buf = await paced(u.download_media, thumbs[0].file_id, in_memory=True)
+            return bytes(buf.getbuffer()) if buf else None
+        except Exception as e:
+            logger.warning(f"Source thumbnail download failed: {e}")
+    return None
+
+
+async def thumb_file(u, media, d):
+    """source_thumb as an in-memory file that send_* and InputMedia* accept as `thumb`."""
+    tb = await source_thumb(u, media, d)
+    if not tb:
+        return None
+    buf = io.BytesIO(tb)
+    buf.name = 'thumb.jpg'
+    return buf
+
+
+async def video_meta(m, path, thumb, sender):
+    """(duration, width, height, thumb) for sending `path` as the video of `m`.
+
+    Source attributes first; the file is only probed for what is missing,
+    and a frame is only grabbed when there is no thumbnail at all.
+    """
+    v = m.video
+    dur, w, h = (v.duration, v.width, v.height) if v else (0, 0, 0)
+    if not (dur and w and h) and isinstance(path, str):
+        mtd = await get_video_metadata(path)
+        dur, w, h = dur or mtd['duration'], w or mtd['width'], h or mtd['height']
+    if not thumb and isinstance(path, str):
+        thumb = await screenshot(path, dur, sender)
+    return dur, w, h, thumb
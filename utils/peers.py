@@ -0,0 +1,75 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import logging
+from pymongo import UpdateOne
+from utils.func import peers_collection
+
+logger = logging.getLogger(__name__)
+
+# Pyrogram keeps peers (id -> access hash) in its session storage. Session
+# string clients use in-memory storage, so that table is empty after every
+# start. Access hashes are per account, so the store is keyed by the
+# account id of the client, not by our user id.
+
+PEER_COLUMNS = "id, access_hash, type, username, phone_number"
+
+
+def _owner(client):
+    me = getattr(client, 'me', None)
+    return me.id if me else None
+
+
+def _rows(client, peer_id=None):
+    conn = client.storage.conn
+    if peer_id is None:
+        return conn.execute(f"SELECT {PEER_COLUMNS} FROM peers").fetchall()
+    return conn.execute(f"SELECT {PEER_COLUMNS} FROM peers WHERE id = ?", (peer_id,)).fetchall()
+
+
+async def known(client, peer_id):
+    try:
+        await client.storage.get_peer_by_id(int(peer_id))
+        return True
+    except Exception:
+        return False
+
+
+async def save_peers(client, peer_id=None):
+    owner = _owner(client)
+    if owner is None:
+        return 0
+    try:
+        ops = [
+            UpdateOne(
+                {"_id": f"{owner}:{pid}"},
+                {"$set": {"owner": owner, "id": pid, "access_hash": ah, "type": pt,
+                          "username": un, "phone_number": ph}},
+                upsert=True
+            )
+            for pid, ah, pt, un, ph in _rows(client, peer_id)
+        ]
+        if ops:
+            await peers_collection.bulk_write(ops, ordered=False)
+        return len(ops)
+    except Exception as e:
+        logger.error(f"Error saving peers of {owner}: {e}")
+        return 0
+
+
+async def load_peers(client):
+    owner = _owner(client)
+    if owner is None:
+        return 0
+    try:
+        peers = [
+            (p["id"], p["access_hash"], p["type"], p.get("username"), p.get("phone_number"))
+            async for p in peers_collection.find({"owner": owner})
+        ]
+        if peers:
+            await client.storage.update_peers(peers)
+        return len(peers)
+    except Exception as e:
+        logger.error(f"Error loading peers of {owner}: {e}")
+        return 0
@@ -0,0 +1,155 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def _aiter(keys):
+    if hasattr(keys, '__aiter__'):
+        async for k in keys:
+            yield k
+    else:
+        for k in keys:
+            yield k
+
+
+class Pipeline:
+    """Runs fetch -> download -> upload as separate stages over a stream of keys.
+
+    Every stage has its own worker count. At most `prefetch` items are in flight
+    across all stages, and `upload` gets a `turn` coroutine to await right before
+    it delivers, so results reach the target chat in source order even when
+    several items are downloading or uploading at once.
+    """
+
+    def __init__(self, keys, fetch, download, upload, done=None, stop=None,
+                 prefetch=8, fetchers=1, downloaders=2, uploaders=1):
+        self.keys = _aiter(keys)
+        self.fetch = fetch
+        self.download = download
+        self.upload = upload
+        self.done = done
+        self.stop = stop or (lambda: False)
+        self.prefetch = max(prefetch, downloaders, uploaders, 1)
+        self.fetchers = max(fetchers, 1)
+        self.downloaders = max(downloaders, 1)
+        self.uploaders = max(uploaders, 1)
+        self.stopped = False
+
+        self._cv = asyncio.Condition()
+        self._klock = asyncio.Lock()
+        self._taken = 0
+        self._total = None
+        self._next = 0
+        self._up = 0
+        self._ready = {}
+        self._fq = asyncio.Queue()
+
+    async def _wait(self, pred):
+        async with self._cv:
+            await self._cv.wait_for(pred)
+
+    async def _notify(self, fn=None):
+        async with self._cv:
+            if fn: fn()
+            self._cv.notify_all()
+
+    async def _take(self):
+        async with self._klock:
+            if self._total is not None:
+                return None
+            if self.stop():
+                self.stopped = True
+            else:
+                try:
+                    key = await self.keys.__anext__()
+                    n = self._taken
+                    self._taken += 1
+                    return n, key
+                except StopAsyncIteration:
+                    pass
+            await self._notify(lambda: setattr(self, '_total', self._taken))
+            return None
+
+    async def _fetcher(self):
+        while True:
+            x = await self._take()
+            if x is None:
+                return
+            n, key = x
+            await self._wait(lambda: n < self._next + self.prefetch)
+            try:
+                item = await self.fetch(key)
+            except Exception as e:
+                logger.error(f"Fetch failed for {key}: {e}")
+                item = None
+            await self._fq.put((n, key, item))
+
+    async def _downloader(self):
+        while True:
+            x = await self._fq.get()
+            if x is None:
+                return
+            n, key, item = x
+            job = None
+            if item is not None:
+                try:
+                    job = await self.download(key, item)
+                except Exception as e:
+                    job = f'Error: {str(e)[:50]}'
+            await self._notify(lambda: self._ready.__setitem__(n, (key, job)))
+
+    async def _uploader(self):
+        while True:
+            async with self._cv:
+                n = self._up
+                self._up += 1
+                await self._cv.wait_for(lambda: n in self._ready or (self._total is not None and n >= self._total))
+                if n not in self._ready:
+                    return
+                key, job = self._ready.pop(n)
+
+            turned = False
+
+            async def turn():
+                nonlocal turned
+                if not turned:
+                    await self._wait(lambda: self._next == n)
+                    turned = True
+
+            res = None
+            try:
+                if isinstance(job, str) or job is None:
+                    res = job
+                else:
+                    res = await self.upload(key, job, turn)
+            except Exception as e:
+                res = f'Error: {str(e)[:50]}'
+            finally:
+                await turn()
+                if self.done:
+                    try:
+                        await self.done(key, res)
+                    except Exception as e:
+                        logger.error(f"Result callback failed for {key}: {e}")
+                await self._notify(lambda: setattr(self, '_next', n + 1))
+
+    async def run(self):
+        fetchers = [asyncio.create_task(self._fetcher()) for _ in range(self.fetchers)]
+        downloaders = [asyncio.create_task(self._downloader()) for _ in range(self.downloaders)]
+        uploaders = [asyncio.create_task(self._uploader()) for _ in range(self.uploaders)]
+        try:
+            await asyncio.gather(*fetchers)
+            for _ in downloaders:
+                await self._fq.put(None)
+            await asyncio.gather(*downloaders)
+            await asyncio.gather(*uploaders)
+        finally:
+            for t in fetchers + downloaders + uploaders:
+                t.cancel()
+        # a stop after the last key was taken still counts, the tail was cut short
+        return not (self.stopped or self.stop())
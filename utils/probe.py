@@ -0,0 +1,124 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import FFMPEG_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# One process-wide probe service. Every ffprobe/ffmpeg child goes through
+# `run`, which holds one of FFMPEG_WORKERS slots, so a big video batch
+# cannot start dozens of decoders at once. The cv2 fallback (no ffprobe
+# on the host) runs on one shared, equally small thread pool.
+
+CACHE_SIZE = 256
+
+slots = asyncio.Semaphore(FFMPEG_WORKERS)
+executor = ThreadPoolExecutor(max_workers=FFMPEG_WORKERS, thread_name_prefix='probe')
+cache = OrderedDict()
+
+
+async def run(*cmd):
+    """Run an ffmpeg-family command in one of the shared slots, return (returncode, stdout, stderr)."""
+    async with slots:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            out, err = await proc.communicate()
+        except BaseException:
+            # cancelled job, do not leave the child running
+            if proc.returncode is None:
+                proc.kill()
+            raise
+        return proc.returncode, out, err
+
+
+def _num(x, cast=float):
+    try:
+        return cast(float(x))
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse(data):
+    """Reduce ffprobe's -show_streams -show_format JSON to what the uploaders need."""
+    fmt = data.get('format', {})
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    return {
+        'duration': round(_num(fmt.get('duration')) or _num(video.get('duration'))),
+        'width': _num(video.get('width'), int),
+        'height': _num(video.get('height'), int),
+        'vcodec': video.get('codec_name'),
+        'acodec': audio.get('codec_name'),
+        'codecs': [s.get('codec_name') for s in streams if s.get('codec_name')],
+        'bitrate': _num(fmt.get('bit_rate'), int),
+        'format': fmt.get('format_name'),
+    }
+
+
+def _cv2_probe(path):
+    import cv2
+    vcap = cv2.VideoCapture(path)
+    try:
+        if not vcap.isOpened():
+            return None
+        fps = vcap.get(cv2.CAP_PROP_FPS)
+        frames = vcap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return {
+            'duration': round(frames / fps) if fps > 0 else 0,
+            'width': round(vcap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': round(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'vcodec': None, 'acodec': None, 'codecs': [], 'bitrate': 0, 'format': None,
+        }
+    finally:
+        vcap.release()
+
+
+async def _probe(path):
+    try:
+        code, out, err = await run('ffprobe', '-v', 'error', '-print_format', 'json',
+                                   '-show_streams', '-show_format', path)
+        if code == 0:
+            return parse(json.loads(out or b'{}'))
+        logger.warning(f"ffprobe failed on {path}: {err.decode(errors='ignore').strip()[:200]}")
+    except FileNotFoundError:
+        logger.warning("ffprobe not found, probing with cv2")
+    except ValueError as e:
+        logger.warning(f"Unreadable ffprobe output for {path}: {e}")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, _cv2_probe, path)
+    except Exception as e:
+        logger.error(f"cv2 probe failed on {path}: {e}")
+        return None
+
+
+async def probe(path):
+    """Duration, dimensions, codecs and bitrate of `path`, or None if it cannot be read.
+
+    Cached by (path, size, mtime), so the same file is probed once no matter
+    how many steps (metadata, thumbnail, remux) ask for it.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    info = await _probe(path)
+    if info is not None:
+        cache[key] = info
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+    return info
@@ -0,0 +1,19 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import logging
+from config import RELAY_WORKERS
+from utils.upload import save_stream
+
+logger = logging.getLogger(__name__)
+
+# Streams a file from one client straight into another client's upload
+# without touching disk: stream_media chunks are cut into 512 KB parts and
+# pushed through a bounded queue to SaveFilePart/SaveBigFilePart workers.
+
+
+async def relay(src, dst, m, media, name, progress=None, progress_args=()):
+    """Stream the media of `m` from client `src` into an upload on client `dst`."""
+    return await save_stream(dst, src.stream_media(m), media.file_size, name, workers=RELAY_WORKERS,
+                             progress=progress, progress_args=progress_args)
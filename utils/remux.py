@@ -0,0 +1,92 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import struct
+import logging
+from config import REMUX
+from utils.probe import run, probe
+from utils.admission import admission
+
+logger = logging.getLogger(__name__)
+
+# Telegram streams and previews a video only when it is an MP4 with the
+# index (moov) before the data. Videos whose codecs MP4 can carry are
+# stream-copied into such a file: no re-encoding, so it costs disk I/O and
+# almost no CPU. The ffmpeg child waits for a probe slot like every other
+# one. Anything else is better sent as a document than as a broken video.
+
+MP4_VIDEO = {'h264', 'hevc', 'av1', 'mpeg4'}
+MP4_AUDIO = {'aac', 'mp3', 'opus', 'ac3', 'eac3', 'flac', 'alac'}
+
+
+def _faststart(path):
+    """True if the top-level moov box of an MP4 comes before its mdat."""
+    with open(path, 'rb') as fp:
+        while True:
+            head = fp.read(8)
+            if len(head) < 8:
+                return False
+            size, box = struct.unpack('>I4s', head)
+            if box == b'moov':
+                return True
+            if box == b'mdat':
+                return False
+            if size == 1:
+                size = struct.unpack('>Q', fp.read(8))[0] - 8
+            elif size < 8:
+                return False
+            fp.seek(size - 8, os.SEEK_CUR)
+
+
+def fits(info):
+    return bool(info['vcodec'] in MP4_VIDEO
+                and (info['acodec'] is None or info['acodec'] in MP4_AUDIO))
+
+
+async def streamable(path, owner=None):
+    """Return (path, as_video) for a downloaded video.
+
+    The video is remuxed to `<name>.mp4` with +faststart when needed and the
+    original removed. `as_video` is False when the codecs do not fit in MP4
+    or the remux failed, and the file should go out as a document. The copy
+    briefly doubles the file on disk, that room is reserved for `owner`.
+    """
+    if not REMUX:
+        return path, True
+    info = await probe(path)
+    if not info or not info['format']:
+        return path, True  # no ffprobe result, cannot tell, upload as before
+    if not fits(info):
+        logger.info(f"{path}: {info['vcodec']}/{info['acodec']} does not fit in MP4, sending as document")
+        return path, False
+    base, ext = os.path.splitext(path)
+    if ext.lower() == '.mp4' and 'mp4' in (info['format'] or '') and _faststart(path):
+        return path, True
+    out = base + '.mp4'
+    tmp = base + '.remux.mp4'
+    try:
+        token = await admission.reserve(os.path.getsize(path), owner)
+    except IOError as e:
+        logger.warning(f"No room to remux {path}, uploading as it is: {e}")
+        return path, True
+    ok = False
+    try:
+        code, _, err = await run('ffmpeg', '-v', 'error', '-y', '-i', path, '-map', '0:V:0', '-map', '0:a:0?',
+                                 '-c', 'copy', '-movflags', '+faststart', tmp)
+        if code != 0:
+            logger.warning(f"Remux of {path} failed: {err.decode(errors='ignore').strip()[:200]}")
+            return path, False
+        os.replace(tmp, out)
+        ok = True
+    except FileNotFoundError:
+        logger.warning("ffmpeg not found, uploading without remux")
+        return path, True
+    finally:
+        admission.release(token)
+        if not ok and os.path.exists(tmp):
+            os.remove(tmp)
+    if out != path:
+        os.remove(path)
+    return out, True
@@ -0,0 +1,125 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from config import MAX_TRANSFERS, USER_TRANSFERS, PREMIUM_WEIGHT
+
+logger = logging.getLogger(__name__)
+
+
+class Ticket:
+    __slots__ = ('user', 'tag', 'seq', 'future', 'on_wait', 'position')
+
+    def __init__(self, user, tag, seq, on_wait):
+        self.user = user
+        self.tag = tag
+        self.seq = seq
+        self.future = asyncio.get_running_loop().create_future()
+        self.on_wait = on_wait
+        self.position = None
+
+
+class Scheduler:
+    """Global pool of transfer slots shared by every plugin.
+
+    At most `workers` transfers run at once and at most `per_user` of them for
+    one user. Waiting requests are served by weighted fair queuing: each new
+    request of a user is tagged one step (1/weight) after that user's previous
+    one, and the smallest tag goes first, so a user with a long batch cannot
+    starve the others and premium users get `premium_weight` times the share.
+    """
+
+    def __init__(self, workers=MAX_TRANSFERS, per_user=USER_TRANSFERS, premium_weight=PREMIUM_WEIGHT):
+        self.workers = max(workers, 1)
+        self.per_user = max(per_user, 1)
+        self.premium_weight = max(premium_weight, 1)
+        self.busy = 0
+        self.running = {}
+        self.last = {}
+        self.clock = 0.0
+        self.waiting = []
+        self.seq = itertools.count()
+        self.served = 0
+
+    def _queue(self):
+        return sorted(self.waiting, key=lambda t: (t.tag, t.seq))
+
+    def _pump(self):
+        queue = self._queue()
+        for t in queue:
+            if self.busy >= self.workers:
+                break
+            if self.running.get(t.user, 0) >= self.per_user:
+                continue
+            self.waiting.remove(t)
+            self.busy += 1
+            self.running[t.user] = self.running.get(t.user, 0) + 1
+            self.clock = max(self.clock, t.tag)
+            self.served += 1
+            t.future.set_result(None)
+        for n, t in enumerate(self._queue(), 1):
+            if t.position != n:
+                t.position = n
+                if t.on_wait:
+                    asyncio.ensure_future(self._report(t, n))
+
+    async def _report(self, t, n):
+        try:
+            await t.on_wait(n)
+        except Exception as e:
+            logger.error(f"Queue position callback failed for {t.user}: {e}")
+
+    async def acquire(self, user, premium=False, on_wait=None):
+        weight = self.premium_weight if premium else 1
+        tag = max(self.clock, self.last.get(user, 0.0)) + 1 / weight
+        self.last[user] = tag
+        t = Ticket(user, tag, next(self.seq), on_wait)
+        self.waiting.append(t)
+        self._pump()
+        try:
+            await t.future
+        except asyncio.CancelledError:
+            if t in self.waiting:
+                self.waiting.remove(t)
+                self._pump()
+            elif t.future.done() and not t.future.cancelled():
+                self.release(user)
+            raise
+        if t.position and on_wait:
+            await self._report(t, 0)
+
+    def release(self, user):
+        self.busy -= 1
+        left = self.running.get(user, 1) - 1
+        if left:
+            self.running[user] = left
+        else:
+            self.running.pop(user, None)
+            if not any(t.user == user for t in self.waiting):
+                self.last.pop(user, None)
+        self._pump()
+
+    @asynccontextmanager
+    async def slot(self, user, premium=False, on_wait=None):
+        """Hold one transfer slot. `on_wait(position)` is called while queued, and with 0 once started."""
+        await self.acquire(user, premium, on_wait)
+        try:
+            yield
+        finally:
+            self.release(user)
+
+    def stats(self):
+        return {
+            'running': self.busy,
+            'workers': self.workers,
+            'waiting': len(self.waiting),
+            'users': len(self.running),
+            'served': self.served,
+        }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,52 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Long jobs run as background tasks registered here, so the handler that
+# started them returns at once and the client's few handler workers stay
+# free for /start, /settings, /stop and friends.
+
+tasks = {}
+
+
+def _finished(key, task):
+    if tasks.get(key) is task:
+        tasks.pop(key)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background task {key} failed: {task.exception()}")
+
+
+def spawn(key, coro):
+    """Run `coro` in the background under `key` and return its task."""
+    task = asyncio.create_task(coro)
+    tasks[key] = task
+    task.add_done_callback(lambda t: _finished(key, t))
+    return task
+
+
+def running(key):
+    task = tasks.get(key)
+    return task is not None and not task.done()
+
+
+def cancel(key):
+    task = tasks.get(key)
+    if task and not task.done():
+        task.cancel()
+        return True
+    return False
+
+
+def counts():
+    """Number of running tasks per kind (first item of tuple keys)."""
+    out = {}
+    for key, task in tasks.items():
+        if not task.done():
+            kind = key[0] if isinstance(key, tuple) else key
+            out[kind] = out.get(kind, 0) + 1
+    return out
@@ -0,0 +1,79 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import io
+import os
+import logging
+from collections import OrderedDict
+from utils.flight import SingleFlight
+from utils.probe import run, probe
+
+logger = logging.getLogger(__name__)
+
+# Frame grabs for videos without a thumbnail. ffmpeg seeks to the nearest
+# keyframe, decodes only keyframes and scales to Telegram's 320 px box in
+# the same pass, writing the JPEG to stdout, so there is no shared output
+# file to race on. The ffmpeg child holds one of the probe slots, and the
+# bytes are kept per source file, so every caller for the same file shares
+# one grab.
+
+MAX_SIDE = 320
+MAX_BYTES = 200 * 1024
+CACHE_SIZE = 64
+QUALITY = (4, 10, 20)  # mjpeg -q:v steps, tried until the thumb fits MAX_BYTES
+
+cache = OrderedDict()
+grabs = SingleFlight()
+
+
+async def _grab(path, at):
+    for q in QUALITY:
+        code, out, err = await run(
+            'ffmpeg', '-v', 'error', '-skip_frame', 'nokey', '-noaccurate_seek', '-ss', str(max(int(at), 0)),
+            '-i', path, '-an', '-sn', '-frames:v', '1',
+            '-vf', f"scale='min({MAX_SIDE},iw)':'min({MAX_SIDE},ih)':force_original_aspect_ratio=decrease",
+            '-f', 'image2', '-c:v', 'mjpeg', '-q:v', str(q), 'pipe:1'
+        )
+        if code != 0 or not out:
+            logger.warning(f"Thumbnail of {path} failed: {err.decode(errors='ignore').strip()[:200]}")
+            return None
+        if len(out) <= MAX_BYTES:
+            return out
+    return None
+
+
+async def frame(path, duration=0):
+    """JPEG bytes of a keyframe from the middle of `path`, at most 320 px and 200 KB, or None."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    if not duration:
+        info = await probe(path)
+        duration = info['duration'] if info else 0
+    try:
+        async with grabs.join(key, lambda: _grab(path, duration // 2)) as data:
+            pass
+    except FileNotFoundError:
+        logger.warning("ffmpeg not found, no thumbnail")
+        return None
+    if data:
+        cache[key] = data
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+    return data
+
+
+async def thumb(path, duration=0):
+    """frame() as a fresh in-memory file that send_* accept as `thumb`."""
+    data = await frame(path, duration)
+    if not data:
+        return None
+    buf = io.BytesIO(data)
+    buf.name = 'thumb.jpg'
+    return buf
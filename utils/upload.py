@@ -0,0 +1,147 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import math
+import asyncio
+import logging
+from pyrogram import raw, types
+from pyrogram import utils as pyro_utils
+from devgagantools import fast_upload
+from config import UP_WORKERS, RELAY_BUFFER
+from utils.download import get_sessions
+
+logger = logging.getLogger(__name__)
+
+# Shared uploader. Telethon callers (ytdl) use devgagantools' fast_upload;
+# Pyrogram callers (batch) use save_file/save_stream, which send 512 KB
+# parts concurrently over several media sessions and return the InputFile
+# for send_uploaded.
+
+__all__ = ['fast_upload', 'save_stream', 'save_file', 'save_bytes', 'send_uploaded', 'PART_SIZE']
+
+PART_SIZE = 512 * 1024
+BIG_FILE = 10 * 1024 * 1024
+
+
+async def save_stream(client, chunks, size, name, workers=UP_WORKERS, buffer=RELAY_BUFFER,
+                      progress=None, progress_args=()):
+    """Upload an async iterator of bytes of known `size`, return the InputFile for it."""
+    file_id = client.rnd_id()
+    big = size > BIG_FILE
+    total = max(1, math.ceil(size / PART_SIZE))
+    workers = max(1, min(workers, total))
+    pool = await get_sessions(client, await client.storage.dc_id(), workers)
+    queue = asyncio.Queue(max(buffer, workers))
+    sent = 0
+
+    async def produce():
+        part, buf = 0, bytearray()
+        async for chunk in chunks:
+            buf += chunk
+            while len(buf) >= PART_SIZE:
+                await queue.put((part, bytes(buf[:PART_SIZE])))
+                del buf[:PART_SIZE]
+                part += 1
+        if buf or part == 0:
+            await queue.put((part, bytes(buf)))
+            part += 1
+        for _ in range(workers):
+            await queue.put(None)
+        return part
+
+    async def consume(session):
+        nonlocal sent
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            part, data = item
+            if big:
+                rpc = raw.functions.upload.SaveBigFilePart(file_id=file_id, file_part=part,
+                                                           file_total_parts=total, bytes=data)
+            else:
+                rpc = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=data)
+            if not await session.invoke(rpc):
+                raise IOError(f"Part {part} of {name} was not accepted")
+            sent += len(data)
+            if progress:
+                await progress(min(sent, size), size, *progress_args)
+
+    tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(consume(s)) for s in pool]
+    try:
+        parts = (await asyncio.gather(*tasks))[0]
+    finally:
+        for t in tasks:
+            t.cancel()
+    if parts != total:
+        raise IOError(f"{name}: got {parts} parts, expected {total}")
+    if big:
+        return raw.types.InputFileBig(id=file_id, parts=total, name=name)
+    return raw.types.InputFile(id=file_id, parts=total, name=name, md5_checksum="")
+
+
+async def _read_parts(path):
+    with open(path, 'rb') as fp:
+        while True:
+            data = await asyncio.to_thread(fp.read, PART_SIZE)
+            if not data:
+                return
+            yield data
+
+
+async def save_file(client, path, workers=UP_WORKERS, progress=None, progress_args=()):
+    return await save_stream(client, _read_parts(path), os.path.getsize(path), os.path.basename(path),
+                             workers=workers, progress=progress, progress_args=progress_args)
+
+
+async def save_bytes(client, data, name):
+    async def one():
+        yield data
+    return await save_stream(client, one(), len(data), name, workers=1)
+
+
+def _media(kind, file, thumb=None, mime_type=None, file_name=None, duration=0, width=0, height=0,
+           performer=None, title=None):
+    if kind == 'photo':
+        return raw.types.InputMediaUploadedPhoto(file=file)
+    attrs = []
+    if kind == 'video':
+        attrs.append(raw.types.DocumentAttributeVideo(duration=duration or 0, w=width or 0, h=height or 0,
+                                                      supports_streaming=True))
+    elif kind == 'video_note':
+        attrs.append(raw.types.DocumentAttributeVideo(duration=duration or 0, w=width or 0, h=height or 0,
+                                                      round_message=True))
+    elif kind == 'audio':
+        attrs.append(raw.types.DocumentAttributeAudio(duration=duration or 0, performer=performer, title=title))
+    elif kind == 'voice':
+        attrs.append(raw.types.DocumentAttributeAudio(duration=duration or 0, voice=True))
+    if file_name and kind != 'voice':
+        attrs.append(raw.types.DocumentAttributeFilename(file_name=file_name))
+    return raw.types.InputMediaUploadedDocument(
+        mime_type=mime_type or ('video/mp4' if kind == 'video' else 'application/octet-stream'),
+        file=file, thumb=thumb, attributes=attrs,
+        force_file=True if kind == 'document' else None
+    )
+
+
+async def send_uploaded(client, chat_id, kind, file, caption=None, reply_to_message_id=None, **meta):
+    """send_* for a file that was already uploaded with save_file/save_stream/save_bytes."""
+    r = await client.invoke(
+        raw.functions.messages.SendMedia(
+            peer=await client.resolve_peer(chat_id),
+            media=_media(kind, file, **meta),
+            random_id=client.rnd_id(),
+            reply_to_msg_id=reply_to_message_id,
+            **await pyro_utils.parse_text_entities(client, caption or "", None, None)
+        )
+    )
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                client, update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats}
+            )
+    return None